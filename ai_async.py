@@ -0,0 +1,191 @@
+import asyncio
+import os
+import threading
+import weakref
+from dotenv import load_dotenv
+import openai
+from openai import OpenAIError, BadRequestError, RateLimitError
+from ai import fallback_decision, backoff_delay, retry_after_seconds, NON_RETRYABLE_ERRORS
+from metrics import inc
+from response_parsing import (
+    parse_decision, parse_repaired, repair_messages, message_text, DecisionParseError, RESPONSE_FORMAT, REPAIR_MODEL
+)
+from prompts import build_messages, DEFAULT_TOKEN_BUDGET
+
+load_dotenv()
+
+_loop_clients = weakref.WeakKeyDictionary()  # 이벤트 루프 -> 비동기 클라이언트
+_loop_clients_lock = threading.Lock()
+
+
+# 이벤트 루프마다 하나씩 공유하는 비동기 클라이언트 (재시도는 아래에서 직접 처리)
+# 클라이언트의 연결 풀은 만들어진 루프에 묶이므로, asyncio.run 을 다시 부르면(Streamlit 재실행 등) 새로 만든다.
+def get_async_client(api_key=None):
+    loop = asyncio.get_running_loop()
+    with _loop_clients_lock:
+        client = _loop_clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(api_key=api_key or os.getenv('OPEN_AI_API_KEY'), max_retries=0)
+            _loop_clients[loop] = client
+        return client
+
+
+# asyncio 기반 의사결정 API
+# - 호출마다 timeout 적용, 동시에 보내는 요청 수는 세마포어로 제한
+# - 재시도 대기는 asyncio.sleep 이라 이벤트 루프를 막지 않는다
+class AsyncStockDecisionAI:
+    def __init__(
+        self,
+        model="o4-mini-2025-04-16",
+        client=None,
+        cache=None,
+        token_budget=DEFAULT_TOKEN_BUDGET,
+        max_concurrency=32,
+        timeout=60.0,
+        max_retries=3,
+        base_delay=0.5,
+        max_delay=20.0,
+        fallback=None,
+        structured=True,
+        repair_model=REPAIR_MODEL
+    ):
+        self.model = model
+        self.structured = structured      # 스키마 기반 구조화 출력 요청
+        self.repair_model = repair_model  # 형식이 깨진 응답을 고치는 저렴한 모델
+        self.fallback = fallback
+        self.cache = cache
+        self.token_budget = token_budget
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.api_key = os.getenv('OPEN_AI_API_KEY')
+        if client is None and not self.api_key:
+            raise ValueError("API key is required for OpenAI.")
+        self.client = client  # 없으면 실행 중인 루프의 공유 클라이언트를 쓴다
+        self.max_concurrency = max_concurrency
+        self._semaphores = weakref.WeakKeyDictionary()  # 이벤트 루프 -> 동시 요청 제한 세마포어
+
+    # 세마포어도 루프에 묶이므로 실행 중인 루프마다 따로 만든다
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def _complete(self, messages, model=None):
+        kwargs = {"response_format": RESPONSE_FORMAT} if self.structured else {}
+        client = self.client or get_async_client(self.api_key)
+        async with self._semaphore():
+            completion = await asyncio.wait_for(
+                client.chat.completions.create(model=model or self.model, messages=messages, **kwargs),
+                timeout=self.timeout
+            )
+        return message_text(completion.choices[0].message)
+
+    # 파싱 실패 시 전체 판단을 다시 하지 않고 형식 복구 요청 한 번
+    # 복구 요청 자체의 오류는 여기서 처리하고 원래 파싱 오류로 돌려서 일반 재시도로 넘긴다
+    async def _parse_or_repair(self, raw):
+        try:
+            return parse_decision(raw)
+        except DecisionParseError as e:
+            if self.repair_model is None or not raw:
+                raise
+            inc("decision_repair_requests_total")
+            try:
+                return parse_repaired(await self._complete(repair_messages(raw, e), model=self.repair_model))
+            except DecisionParseError as repair_error:
+                print(f"응답 형식 복구 실패: {repair_error}")
+            except (OpenAIError, asyncio.TimeoutError) as repair_error:
+                inc("llm_errors_total", type=type(repair_error).__name__)
+                print(f"응답 형식 복구 요청 오류: {type(repair_error).__name__} - {repair_error}")
+            raise
+
+    async def get_stock_decision(
+        self,
+        market,
+        company_name,
+        price_hist_1y,
+        price_hist_10m,
+        current_price,
+        current_count,
+        current_money,
+        ma_5m,
+        ma_20m,
+        ma_5d,
+        ma_20d,
+        prev_res,
+        max_retries=None,
+        indicators=None,
+        avg_cost=None
+    ):
+        inputs = {
+            "market": market,
+            "company_name": company_name,
+            "price_hist_1y": price_hist_1y,
+            "price_hist_10m": price_hist_10m,
+            "current_price": current_price,
+            "current_count": current_count,
+            "current_money": current_money,
+            "ma_5m": ma_5m,
+            "ma_20m": ma_20m,
+            "ma_5d": ma_5d,
+            "ma_20d": ma_20d,
+            "prev_res": prev_res,
+            "indicators": indicators,
+            "avg_cost": avg_cost,
+        }
+        if self.cache is not None:
+            cached = self.cache.get(inputs)
+            if cached is not None:
+                return cached
+
+        # 프롬프트 생성은 CPU 작업이다 (캐시가 없으면 Monte Carlo 시뮬레이션 포함). 이벤트 루프를 막지 않도록 스레드에서 실행.
+        messages, _ = await asyncio.to_thread(build_messages, inputs, token_budget=self.token_budget)
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        for attempt in range(max_retries):
+            retry_after = None
+            try:
+                res = await self._parse_or_repair(await self._complete(messages))
+                if self.cache is not None:
+                    self.cache.put(inputs, res)
+                return res
+
+            except BadRequestError as e:
+                if self.structured and "response_format" in str(e):
+                    # 구조화 출력을 지원하지 않는 모델: 끄고 바로 다시 요청
+                    self.structured = False
+                    inc("structured_output_unsupported_total")
+                    continue
+                # 같은 요청을 다시 보내도 결과가 같으므로 재시도하지 않는다
+                print(f"[{company_name}] OpenAI API 오류: {type(e).__name__} - {e}")
+                break
+            except NON_RETRYABLE_ERRORS as e:
+                print(f"[{company_name}] OpenAI API 오류: {type(e).__name__} - {e}")
+                break
+            except RateLimitError as e:
+                retry_after = retry_after_seconds(e)
+                print(f"[{company_name}] [{attempt+1}/{max_retries}] 요청 한도 초과 - {e}")
+            except asyncio.TimeoutError:
+                print(f"[{company_name}] [{attempt+1}/{max_retries}] 응답 시간 초과 ({self.timeout}초)")
+            except DecisionParseError as e:
+                print(f"[{company_name}] [{attempt+1}/{max_retries}] 응답 형식 오류: {e}")
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                print(f"[{company_name}] [{attempt+1}/{max_retries}] 일반 오류 발생: {e}")
+
+            if attempt + 1 < max_retries:
+                await asyncio.sleep(backoff_delay(attempt, self.base_delay, self.max_delay, retry_after))
+
+        if self.fallback is not None:
+            print(f"⚠️ [{company_name}] GPT 응답 실패 - 로컬 백엔드 응답 반환")
+            return self.fallback.get_stock_decision(**inputs)
+        print(f"⚠️ [{company_name}] GPT 응답 실패 - 기본 응답 반환")
+        return fallback_decision(current_price)
+
+    # 여러 종목의 입력(get_stock_decision 인자 dict)을 한 번에 받아 동시에 처리, 입력 순서대로 반환
+    async def decide_many(self, inputs_list):
+        return await asyncio.gather(*(self.get_stock_decision(**inputs) for inputs in inputs_list))
+
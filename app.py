@@ -1,169 +1,298 @@
 import streamlit as st
 from simulation import StockSimulator
+from ai import StockDecisionAI
+from decision_cache import DecisionCache
+from decision_backends import FallbackDecisionAI, RuleEngineDecisionAI
+from decision_scheduler import DecisionScheduler
+from decision_gate import GatedDecisionAI
+from indicators import compute_series
+from downsample import ohlc_downsample, bucket_bounds, max_candles
+from metrics import get_metrics, span, start_http_server
+from market_calendar import get_market_calendar
+from ledger import TradeLedger
 import plotly.graph_objects as go
 import datetime
 import pytz
 import json
-import time
+import os
+import atexit
+
+# 화면 새로고침 주기 (초). 판단은 스케줄러가 따로 60초마다 실행한다.
+REFRESH_SECONDS = 10
+DECISION_INTERVAL = 60
 
 # 기본 설정
 st.set_page_config(page_title="📊 AI-based stock analysis", layout="wide")
 st.title("📊 AI-based stock analysis")
 
-simulator = StockSimulator(ticker="NVDA")
-
-# 시간 설정
 kst = pytz.timezone("Asia/Seoul")
-now_kst = datetime.datetime.now(kst)
-
 est = pytz.timezone("US/Eastern")
-now_est = datetime.datetime.now(est)
-market_open_time = now_est.replace(hour=9, minute=30, second=0, microsecond=0)
-market_close_time = now_est.replace(hour=16, minute=0, second=0, microsecond=0)
 
-# 헤더 시간 정보
-st.markdown(f"🕒 현재 시각 (한국): **{now_kst.strftime('%Y-%m-%d %H:%M:%S')}**")
-st.markdown(f"🕒 현재 시각 (뉴욕): **{now_est.strftime('%Y-%m-%d %H:%M:%S')}**")
 
-# 프리마켓 상태 확인
-if now_est < market_open_time or now_est > market_close_time:
-    st.info(f"⏳ 현재는 프리마켓입니다 (한국 기준 {now_kst.strftime('%H:%M')})")
-    # 여기서 새로고침을 60초마다 할 수 있습니다
-    time.sleep(60)  # 1분 동안 대기 후 새로고침
+calendar = get_market_calendar()
+
+
+# 정규장 여부 (NYSE 휴장일 / 조기 폐장 반영)
+def is_market_open():
+    return calendar.is_open()
+
+
+# 재실행 사이에도 유지되는 의사결정 캐시 (입력이 같으면 GPT 호출 생략)
+@st.cache_resource
+def get_decision_cache():
+    return DecisionCache(ttl=300, max_size=1024)
+
+
+# 프로세스당 하나의 체결 원장 (재시작해도 종목별 현금 / 보유 수량을 이어간다)
+# 종료 시 아직 기록하지 않은 체결을 내보내고 닫는다
+@st.cache_resource
+def get_ledger():
+    ledger = TradeLedger()  # TRADE_LEDGER_PATH 또는 ~/.as_project/ledger.db
+    atexit.register(ledger.close)
+    return ledger
+
+
+# 프로세스당 하나의 OpenAI 클라이언트
+# GPT 가 제한 시간 안에 답하지 못하거나 규칙을 어기면 로컬 규칙 엔진 결과를 사용
+# 이동 평균 교차, 가격 기준 통과, 변동성 급등, 보유 수량 변화가 있거나 15분이 지났을 때만 GPT 를 호출
+# 호출 / 생략 사유는 GATE_LOG_PATH(JSONL)에 남겨서 게이트 유무에 따른 결과를 나중에 다시 비교할 수 있다
+@st.cache_resource
+def get_decision_ai():
+    log_path = os.getenv("GATE_LOG_PATH") or os.path.join(os.path.expanduser("~"), ".as_project", "gate_log.jsonl")
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    return GatedDecisionAI(FallbackDecisionAI(
+        StockDecisionAI(cache=get_decision_cache()),
+        RuleEngineDecisionAI(initial_money=1000),
+        timeout=45
+    ), log_path=log_path)
+
+
+# 프로세스당 하나의 스케줄러
+@st.cache_resource
+def get_scheduler():
+    decision_ai = get_decision_ai()
+    ledger = get_ledger()
+    return DecisionScheduler(
+        lambda ticker: StockSimulator(ticker=ticker, decision_ai=decision_ai, ledger=ledger),
+        interval=DECISION_INTERVAL,
+        calendar=calendar
+    )
+
+
+# METRICS_PORT 를 지정하면 Prometheus 가 긁어갈 /metrics 엔드포인트를 연다 (프로세스당 한 번)
+@st.cache_resource
+def get_metrics_server():
+    return start_http_server() if os.getenv("METRICS_PORT") else None
+
+
+# 사이드바: 구간별 지연 시간 분위수와 카운터
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_metrics_panel():
+    registry = get_metrics()
+    st.subheader("⏱️ 판단 루프 지연 시간")
+    rows = [
+        {
+            "구간": row["labels"].get("stage") or f"render:{row['labels'].get('part')}",
+            "건수": row["count"],
+            "p50 (ms)": round(row["p50"] * 1000, 1),
+            "p95 (ms)": round(row["p95"] * 1000, 1),
+            "p99 (ms)": round(row["p99"] * 1000, 1),
+        }
+        for row in registry.summary() if row["name"] in ("decision_stage_seconds", "render_seconds")
+    ]
+    if rows:
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+    else:
+        st.caption("아직 기록된 구간이 없습니다.")
+    for name, series in sorted(registry.counters().items()):
+        for key, value in sorted(series.items()):
+            label = ", ".join(f"{k}={v}" for k, v in key)
+            st.caption(f"{name}{f' ({label})' if label else ''}: {value:,.0f}")
+    with st.expander("Prometheus 형식"):
+        st.code(registry.export_prometheus(), language="text")
+
+
+# 사이드바: LLM 호출 / 생략 비율과 최근 판단별 사유
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_gate_panel():
+    gated = get_decision_ai()
+    st.subheader("🚦 LLM 호출 게이트")
+    st.caption(f"호출 {gated.stats['calls']:,}회, 생략 {gated.stats['suppressed']:,}회 "
+               f"(호출 비율 {gated.call_rate() * 100:.0f}%) · 기록: {gated.log_path}")
+    rows = [
+        {
+            "시각": entry["time"] if isinstance(entry["time"], str)
+            else datetime.datetime.fromtimestamp(entry["time"], kst).strftime("%H:%M:%S"),
+            "종목": entry["ticker"],
+            "호출": "✅" if entry["called"] else "⏭️",
+            "판단": entry["decision"]["action"],
+            "사유": "; ".join(entry["reasons"]),
+        }
+        for entry in gated.recent(20)
+    ]
+    if rows:
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+    else:
+        st.caption("아직 판단 기록이 없습니다.")
+
+
+def draw_chart(df, show_ma_5, show_ma_20):
+    # 브라우저로 보내는 캔들 수는 차트 폭 기준으로 제한 (OHLC 를 보존하며 묶음)
+    limit = max_candles()
+    candles = ohlc_downsample(df, limit, time_col='Datetime')
+
+    # 차트 그리기
+    fig = go.Figure(data=[go.Candlestick(
+        x=candles['Datetime'],
+        open=candles['Open'],
+        high=candles['High'],
+        low=candles['Low'],
+        close=candles['Close'],
+        increasing_line_color='green',
+        decreasing_line_color='red'
+    )])
+
+    # 이동평균선 추가 (선택된 경우에만, 전체 시계열을 한 번에 계산)
+    if show_ma_5 or show_ma_20:
+        series = compute_series(df['Close'], sma_windows=(5, 20))
+        if len(candles) < len(df):
+            # 원본 해상도로 계산한 뒤 각 묶음의 마지막 값만 표시
+            _, ends = bucket_bounds(len(df), limit)
+            series = series.iloc[ends]
+
+    if show_ma_5:
+        fig.add_trace(go.Scatter(
+            x=candles['Datetime'],
+            y=series['sma_5'],
+            mode='lines',
+            name='5일 이동평균선',
+            line=dict(color='blue', width=2)
+        ))
+
+    if show_ma_20:
+        fig.add_trace(go.Scatter(
+            x=candles['Datetime'],
+            y=series['sma_20'],
+            mode='lines',
+            name='20일 이동평균선',
+            line=dict(color='orange', width=2)
+        ))
+
+    # 차트 레이아웃 설정
+    fig.update_layout(
+        template="plotly_white",
+        height=600,
+        xaxis_title="시간 (KST)",
+        xaxis_rangeslider_visible=False,
+        xaxis=dict(
+            tickformat="%H:%M:%S",
+            tickangle=0
+        ),
+        yaxis_title="가격 (USD)"
+    )
+    return fig
+
+
+def show_decision(result, current_price):
+    summary_data = result.get("decision_summary", {})
+
+    st.subheader("📊 판단 요약")
+    st.code(json.dumps(summary_data, indent=2, ensure_ascii=False, default=str), language="json")
+
+    # 자산 상태 표시
+    if 'asset_status' in result:
+        st.subheader("💰 현재 자산 상태")
+        st.metric("현금", f"${result['asset_status'].get('cash', 0):.2f}")
+        st.metric("보유 수량", f"{result['asset_status'].get('count', 0)}주")
+        st.metric("총 자산", f"${result['asset_status'].get('total', 0):.2f}")
+        st.metric("현재 주가", f"${current_price:.2f}")
+    else:
+        st.error("❗ 자산 상태 정보를 불러올 수 없습니다.")
+
+    # 액션 결과 메시지
+    action = summary_data.get("action", "hold")
+    if action == "buy":
+        st.success(f"🚀 매수 추천: {result['action_result']}")
+    elif action == "sell":
+        st.warning(f"⚠️ 매도 추천: {result['action_result']}")
+    else:
+        st.info(f"⏸️ 판단: {result['action_result']}")
+
+
+ticker = st.text_input("티커", value="NVDA")
+
+# 이동평균선 표시 여부 선택
+show_ma_5 = st.checkbox("5일 이동평균선 표시")
+show_ma_20 = st.checkbox("20일 이동평균선 표시")
+
+
+# 타이머로 이 부분만 다시 그린다 (네트워크 호출 / GPT 호출 없음, 스케줄러의 최신 결과만 표시)
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_live(ticker, show_ma_5, show_ma_20):
+    now_kst = datetime.datetime.now(kst)
+    now_est = datetime.datetime.now(est)
+
+    # 헤더 시간 정보
+    st.markdown(f"🕒 현재 시각 (한국): **{now_kst.strftime('%Y-%m-%d %H:%M:%S')}**")
+    st.markdown(f"🕒 현재 시각 (뉴욕): **{now_est.strftime('%Y-%m-%d %H:%M:%S')}**")
+
+    # 장 상태 확인 (프리마켓 / 애프터마켓 / 휴장)
+    if not is_market_open():
+        label = {"pre": "프리마켓", "post": "애프터마켓"}.get(calendar.session(), "휴장 시간")
+        next_open = calendar.next_session()
+        next_text = f", 다음 정규장: {next_open[0].astimezone(kst).strftime('%m-%d %H:%M')} (KST)" if next_open else ""
+        st.info(f"⏳ 현재는 {label}입니다 (한국 기준 {now_kst.strftime('%H:%M')}{next_text})")
+        return
 
-else:
     st.success(f"✅ 정규장입니다 (한국 기준 {now_kst.strftime('%H:%M')})")
-    ticker = st.text_input("티커", value="NVDA")
-
-    # 1분봉 데이터 가져오기
-    df = simulator.get_live_candles(ticker)
-
-    if not df.empty:
-        # 📈 실시간 1분봉 차트
-        st.subheader(f"📈 실시간 1분봉 차트 ({ticker})")
-
-        # 이동평균선 표시 여부 선택
-        show_ma_5 = st.checkbox("5일 이동평균선 표시")
-        show_ma_20 = st.checkbox("20일 이동평균선 표시")
-
-        # 차트 그리기
-        fig = go.Figure(data=[go.Candlestick(
-            x=df['Datetime'],
-            open=df['Open'],
-            high=df['High'],
-            low=df['Low'],
-            close=df['Close'],
-            increasing_line_color='green',
-            decreasing_line_color='red'
-        )])
-
-        # 이동평균선 추가 (선택된 경우에만)
-        if show_ma_5:
-            df['MA_5'] = df['Close'].rolling(window=5).mean()
-            fig.add_trace(go.Scatter(
-                x=df['Datetime'], 
-                y=df['MA_5'], 
-                mode='lines', 
-                name='5일 이동평균선', 
-                line=dict(color='blue', width=2)
-            ))
-
-        if show_ma_20:
-            df['MA_20'] = df['Close'].rolling(window=20).mean()
-            fig.add_trace(go.Scatter(
-                x=df['Datetime'], 
-                y=df['MA_20'], 
-                mode='lines', 
-                name='20일 이동평균선', 
-                line=dict(color='orange', width=2)
-            ))
-
-        # 차트 레이아웃 설정
-        fig.update_layout(
-            template="plotly_white",
-            height=600,
-            xaxis_title="시간 (KST)",
-            xaxis_rangeslider_visible=False,
-            xaxis=dict(
-                tickformat="%H:%M:%S",
-                tickangle=0
-            ),
-            yaxis_title="가격 (USD)"
-        )
-
-        # 컬럼을 사용하여 차트와 GPT 판단을 나눔
-        col1, col2 = st.columns([3, 1])  # 차지 비율 3:1로 설정
-
-        # 첫 번째 컬럼에 차트 표시
-        with col1:
-            st.plotly_chart(fig, use_container_width=True)
-
-            # 현재 주가 텍스트로 표시
-            current_price = df['Close'].iloc[-1]
-            st.markdown(f"**현재 주가 (마지막 1분봉):** ${current_price:,.2f}")
-
-        # 두 번째 컬럼에 GPT 판단 표시
-        with col2:
-            # GPT 판단 처리 부분
-            st.subheader("🧠 GPT 투자 판단")
-
-            try:
-                # GPT 판단 결과 획득
-                res = simulator.decision_ai.get_stock_decision(
-                    market="US",
-                    company_name=ticker,
-                    price_hist_1y=df['Close'].to_list(),
-                    price_hist_10m=df['Close'][-10:].to_list(),
-                    current_price=current_price,
-                    current_count=simulator.current_count,
-                    current_money=simulator.current_money,
-                    ma_5m=simulator.ma_5m,
-                    ma_20m=simulator.ma_20m,
-                    ma_5d=simulator.ma_5d,
-                    ma_20d=simulator.ma_20d,
-                    prev_res=simulator.prev_res
-                )
-
-                if not isinstance(res, dict):
-                    raise ValueError("GPT 응답이 딕셔너리 형식이 아닙니다.")
-
-                result = simulator.handle_decision(res, current_price)
-
-                # 판단 요약 표시
-                summary_data = {
-                    "action": result.get("action", "hold"),  # 기본값 'hold' 설정
-                    "quantity": result.get("quantity", 0),  # 기본값 0 설정
-                    "price": result.get("price", 0.0),  # 기본값 0.0 설정
-                    "reason": result.get("reason", "사유 없음"),
-                    "risk_type": result.get("risk_type", "없음")
-                }
-
-                st.subheader("📊 판단 요약")
-                st.code(json.dumps(summary_data, indent=2, ensure_ascii=False), language="json")
-
-                # 자산 상태 표시
-                if 'asset_status' in result:
-                    st.subheader("💰 현재 자산 상태")
-                    st.metric("현금", f"${result['asset_status'].get('cash', 0):.2f}")
-                    st.metric("보유 수량", f"{result['asset_status'].get('count', 0)}주")
-                    st.metric("총 자산", f"${result['asset_status'].get('total', 0):.2f}")
-                    st.metric("현재 주가", f"${result.get('current_price', 0):.2f}")
-                else:
-                    st.error("❗ 자산 상태 정보를 불러올 수 없습니다.")
-
-                # 액션 결과 메시지
-                action = result.get("action", "hold")
-                if action == "buy":
-                    st.success(f"🚀 매수 추천: {result['action_result']}")
-                elif action == "sell":
-                    st.warning(f"⚠️ 매도 추천: {result['action_result']}")
-                else:
-                    st.info(f"⏸️ 판단: {result['action_result']}")
-
-            except json.JSONDecodeError:
-                st.error("❗ JSON 디코딩 중 오류 발생 - 응답이 올바른 형식인지 확인하세요.")
-            except Exception as e:
-                st.error(f"❗ GPT 판단 처리 중 오류 발생: {e}")
-
-        # 새로고침을 부드럽게 하기 위해 데이터가 변경된 후만 새로고침
-        st.rerun()
\ No newline at end of file
+
+    scheduler = get_scheduler()
+    if not scheduler.ensure(ticker):
+        st.error(f"❗ 동시에 추적할 수 있는 종목 수({scheduler.max_tickers})를 넘었습니다.")
+        return
+
+    state = scheduler.latest(ticker)
+    if state is None:
+        st.info("⏳ 첫 번째 판단을 계산하는 중입니다...")
+        return
+    if state.get("fatal"):
+        st.error(f"❗ {ticker} 판단을 시작하지 못했습니다: {state['error']} ({scheduler.restart_delay}초 뒤 다시 시도)")
+        return
+    if state.get("candles") is None:
+        st.warning(f"❗ 데이터를 불러오지 못했습니다: {state.get('error')}")
+        return
+
+    df = state["candles"]
+    current_price = state["price"]
+    updated_kst = state["updated_at"].astimezone(kst)
+
+    # 📈 실시간 1분봉 차트
+    st.subheader(f"📈 실시간 1분봉 차트 ({ticker})")
+
+    # 컬럼을 사용하여 차트와 GPT 판단을 나눔
+    col1, col2 = st.columns([3, 1])  # 차지 비율 3:1로 설정
+
+    # 첫 번째 컬럼에 차트 표시
+    with col1:
+        with span("render_seconds", part="chart"):
+            st.plotly_chart(draw_chart(df, show_ma_5, show_ma_20), use_container_width=True)
+
+        # 현재 주가 텍스트로 표시
+        st.markdown(f"**현재 주가 (마지막 1분봉):** ${current_price:,.2f}")
+
+    # 두 번째 컬럼에 GPT 판단 표시
+    with col2:
+        st.subheader("🧠 GPT 투자 판단")
+        st.caption(f"마지막 판단: {updated_kst.strftime('%H:%M:%S')} (KST), {DECISION_INTERVAL}초마다 갱신")
+        if state.get("error"):
+            st.warning(f"❗ 최근 판단 중 오류 발생: {state['error']}")
+        if state.get("result"):
+            show_decision(state["result"], current_price)
+
+
+render_live(ticker, show_ma_5, show_ma_20)
+
+get_metrics_server()
+with st.sidebar:
+    render_metrics_panel()
+    render_gate_panel()
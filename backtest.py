@@ -0,0 +1,224 @@
+import json
+import time
+import numpy as np
+import pandas as pd
+from indicators import IndicatorEngine
+from simulation import StockSimulator
+
+
+HOLD = {
+    "reason": "백테스트 기본 응답",
+    "risk_type": "안정적",
+    "action": "hold",
+    "quantity": 0,
+}
+
+
+# 로컬 스텁 의사결정 소스: decide(inputs) 함수가 없으면 항상 홀드
+class StubDecisionSource:
+    def __init__(self, decide=None):
+        self.decide = decide
+
+    def get_stock_decision(self, **inputs):
+        if self.decide is None:
+            return dict(HOLD, price=inputs["current_price"])
+        return self.decide(inputs)
+
+
+# 기록해 둔 LLM 응답을 시각 순서대로 재생
+# records: [{"time": "2025-06-02T10:31:00-04:00", "decision": {...}}, ...]
+# 기록 시각을 지난 첫 번째 봉에서 한 번만 해당 응답을 돌려주고, 그 외에는 홀드.
+class RecordedDecisionSource:
+    def __init__(self, records):
+        records = sorted(records, key=lambda r: pd.Timestamp(r["time"]))
+        self.times = [pd.Timestamp(r["time"]) for r in records]
+        self.decisions = [r["decision"] for r in records]
+        self._pos = 0
+        self._now = None
+
+    @classmethod
+    def from_jsonl(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def set_time(self, now):
+        self._now = pd.Timestamp(now)
+
+    def get_stock_decision(self, **inputs):
+        decision = None
+        while self._pos < len(self.times) and self.times[self._pos] <= self._now:
+            decision = self.decisions[self._pos]
+            self._pos += 1
+        if decision is None:
+            return dict(HOLD, price=inputs["current_price"])
+        return decision
+
+
+class BacktestResult:
+    def __init__(self, equity, trades, stats):
+        self.equity = equity  # 봉별 총 자산 (pd.Series)
+        self.trades = trades  # 체결 내역 (pd.DataFrame)
+        self.stats = stats    # 요약 통계 (dict)
+
+    def __repr__(self):
+        return f"BacktestResult({self.stats})"
+
+
+def _bar_times(bars):
+    if isinstance(bars, dict):
+        return pd.DatetimeIndex(bars["Datetime"])
+    if isinstance(bars.index, pd.DatetimeIndex):
+        return bars.index
+    for col in ("Datetime", "Date"):
+        if col in bars.columns:
+            return pd.DatetimeIndex(bars[col])
+    raise ValueError("봉 데이터에 시각 정보(Datetime/Date)가 없습니다.")
+
+
+# 저장된 1분봉/일봉을 실시간과 같은 경로(지표 → 판단 → handle_decision)로 빠르게 재생
+class BacktestEngine:
+    def __init__(
+        self,
+        bars,
+        decision_source,
+        ticker="BACKTEST",
+        initial_money=1000,
+        warmup=20,
+        decision_every=1,
+        market="US",
+        ledger=None,
+        account=None
+    ):
+        self.bars = bars  # DataFrame 또는 {"Datetime": 시각, "Close": 종가 배열} (from_store)
+        self.decision_source = decision_source
+        self.ticker = ticker
+        self.initial_money = initial_money
+        self.warmup = warmup
+        self.decision_every = decision_every  # N봉마다 한 번 판단
+        self.market = market
+        self.ledger = ledger  # 체결을 원장(TradeLedger)에도 기록 (대량 기록은 batch_size 를 크게)
+        self.account = account or f"backtest:{ticker}"
+
+    # 로컬 봉 저장소(BarStore)에 쌓인 구간으로 바로 백테스트 (다시 받거나 파싱하지 않음)
+    # 종가는 memmap 뷰를 그대로 쓰고, 시각만 DatetimeIndex 로 만든다
+    @classmethod
+    def from_store(cls, store, ticker, decision_source, interval="1m", start=None, end=None, **kwargs):
+        cols = store.columns(ticker, interval)
+        view = cols.slice(*cols.rows(start, end))
+        if len(view["ts"]) == 0:
+            raise ValueError(f"저장소에 {ticker} {interval} 봉이 없습니다.")
+        bars = {
+            "Datetime": pd.to_datetime(view["ts"], utc=True).tz_convert(cols.tz),
+            "Close": view["close"],
+        }
+        return cls(bars, decision_source, ticker=ticker, **kwargs)
+
+    def run(self):
+        started = time.perf_counter()
+        times = _bar_times(self.bars)
+        close = np.asarray(self.bars["Close"], dtype=float)
+        n = len(close)
+
+        intraday = n > 1 and (times[1:] - times[:-1]).median() < pd.Timedelta(days=1)
+        periods_per_year = 252 * 390 if intraday else 252
+
+        # 일봉 종가 배열 (분봉이면 날짜별 마지막 종가)과 각 봉이 속한 날짜 번호
+        if intraday:
+            day_codes, day_index = np.unique(times.normalize().asi8, return_inverse=True)
+            last_of_day = np.r_[np.flatnonzero(np.diff(day_index)), n - 1]
+            daily_close = close[last_of_day]
+        else:
+            day_index = np.arange(n)
+            daily_close = close
+
+        if self.ledger is not None:
+            self.ledger.reset(self.account)  # 같은 계좌 이름으로 다시 돌리면 처음부터
+        sim = StockSimulator(ticker=self.ticker, initial_money=self.initial_money, decision_ai=self.decision_source,
+                             ledger=self.ledger, account=self.account)
+        minute = IndicatorEngine()
+        daily = IndicatorEngine()
+        set_time = getattr(self.decision_source, "set_time", None)
+
+        equity = np.empty(n)
+        trades = []
+        prev_day = -1
+
+        for i in range(n):
+            price = close[i]
+            day = day_index[i]
+            if intraday:
+                minute.update(price)
+            daily.update(price, new_bar=day != prev_day)
+            prev_day = day
+
+            if i >= self.warmup and (i - self.warmup) % self.decision_every == 0:
+                if intraday:
+                    sim.ma_5m = minute.smas[5].value
+                    sim.ma_20m = minute.smas[20].value
+                sim.ma_5d = daily.smas[5].value
+                sim.ma_20d = daily.smas[20].value
+                if set_time is not None:
+                    set_time(times[i])
+
+                res = self.decision_source.get_stock_decision(
+                    market=self.market,
+                    company_name=self.ticker,
+                    price_hist_1y=daily_close[max(0, day - 252):day],  # 복사 없는 뷰
+                    price_hist_10m=close[max(0, i - 9):i + 1],
+                    current_price=price,
+                    current_count=sim.current_count,
+                    current_money=sim.current_money,
+                    ma_5m=sim.ma_5m,
+                    ma_20m=sim.ma_20m,
+                    ma_5d=sim.ma_5d,
+                    ma_20d=sim.ma_20d,
+                    prev_res=sim.prev_res,
+                    avg_cost=sim.avg_cost,
+                    indicators={"1분봉": minute.snapshot(), "일봉": daily.snapshot()} if intraday
+                    else {"일봉": daily.snapshot()}
+                )
+
+                count_before = sim.current_count
+                result = sim.handle_decision(res, price)
+                if sim.current_count != count_before:
+                    summary = result["decision_summary"]
+                    trades.append({
+                        "time": times[i],
+                        "action": summary["action"],
+                        "quantity": summary["quantity"],
+                        "price": summary["price"],
+                        "cash": sim.current_money,
+                        "count": sim.current_count,
+                    })
+
+            equity[i] = sim.current_money + sim.current_count * price
+
+        if self.ledger is not None:
+            self.ledger.flush()
+        equity = pd.Series(equity, index=times, name="equity")
+        trades = pd.DataFrame(trades, columns=["time", "action", "quantity", "price", "cash", "count"])
+        stats = summarize(equity, trades, self.initial_money, periods_per_year)
+        stats["bars"] = n
+        stats["elapsed_sec"] = time.perf_counter() - started
+        return BacktestResult(equity, trades, stats)
+
+
+def summarize(equity, trades, initial_money, periods_per_year=252):
+    values = equity.to_numpy(dtype=float)
+    if len(values) == 0:
+        return {"final_equity": initial_money, "total_return": 0.0, "max_drawdown": 0.0, "sharpe": None, "trades": 0}
+
+    peak = np.maximum.accumulate(values)
+    drawdown = (values - peak) / np.where(peak == 0, 1, peak)
+    returns = np.diff(values) / np.where(values[:-1] == 0, 1, values[:-1])
+    std = returns.std() if len(returns) > 1 else 0.0
+
+    return {
+        "final_equity": float(values[-1]),
+        "total_return": float(values[-1] / initial_money - 1) if initial_money else None,
+        "max_drawdown": float(drawdown.min()),
+        "sharpe": float(returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else None,
+        "trades": int(len(trades)),
+        "buys": int((trades["action"] == "buy").sum()) if len(trades) else 0,
+        "sells": int((trades["action"] == "sell").sum()) if len(trades) else 0,
+    }
@@ -0,0 +1,177 @@
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+
+# 종목별 공유 메모리 링 버퍼 (memory-mapped 파일)
+# - 쓰기: collector 프로세스 하나 / 읽기: 여러 프로세스가 잠금 없이 읽는다 (seqlock)
+# - 헤더의 seq 가 홀수면 쓰는 중, 읽기 전후 seq 가 같으면 일관된 스냅샷이다.
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"),  # UTC 기준 epoch 나노초
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+MAGIC = 0x42415252494E4731  # "BARRING1"
+HEADER_WORDS = 8  # magic, capacity, seq, count, last_write_ns, (예약)
+_MAGIC, _CAPACITY, _SEQ, _COUNT, _LAST_WRITE = range(5)
+DEFAULT_CAPACITY = 4096  # 1분봉 약 10 거래일
+
+
+def default_root():
+    root = os.getenv("BAR_RING_DIR")
+    if root:
+        return root
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "as_project_bars")
+
+
+def ring_path(root, ticker, interval):
+    return os.path.join(root, f"{ticker}_{interval}.ring")
+
+
+class BarRing:
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, create=False):
+        self.path = path
+        header_bytes = HEADER_WORDS * 8
+        if create and not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "wb") as f:
+                f.truncate(header_bytes + capacity * BAR_DTYPE.itemsize)
+            header = np.memmap(path, dtype="<i8", mode="r+", shape=(HEADER_WORDS,))
+            header[_CAPACITY] = capacity
+            header[_MAGIC] = MAGIC
+            header.flush()
+            del header
+
+        mode = "r+" if create else "r"
+        self.header = np.memmap(path, dtype="<i8", mode=mode, shape=(HEADER_WORDS,))
+        if self.header[_MAGIC] != MAGIC:
+            raise ValueError(f"링 버퍼 파일이 아닙니다: {path}")
+        self.capacity = int(self.header[_CAPACITY])
+        self.bars = np.memmap(path, dtype=BAR_DTYPE, mode=mode, offset=header_bytes, shape=(self.capacity,))
+
+    @classmethod
+    def open(cls, root, ticker, interval="1m"):
+        path = ring_path(root, ticker, interval)
+        return cls(path) if os.path.exists(path) else None
+
+    @classmethod
+    def create(cls, root, ticker, interval="1m", capacity=DEFAULT_CAPACITY):
+        return cls(ring_path(root, ticker, interval), capacity=capacity, create=True)
+
+    @property
+    def count(self):
+        return int(self.header[_COUNT])
+
+    @property
+    def last_write(self):
+        return int(self.header[_LAST_WRITE])
+
+    def last_ts(self):
+        count = self.count
+        return int(self.bars[(count - 1) % self.capacity]["ts"]) if count else None
+
+    # (쓰기 전용) 새 봉 추가. 마지막 봉과 같은 시각이면 진행 중인 봉으로 보고 덮어쓴다.
+    def upsert(self, records):
+        if len(records) == 0:
+            return
+        self.header[_SEQ] += 1  # 홀수: 쓰는 중
+        count = int(self.header[_COUNT])
+        last = int(self.bars[(count - 1) % self.capacity]["ts"]) if count else None
+        for rec in records:
+            if last is not None and rec["ts"] < last:
+                continue
+            if last is not None and rec["ts"] == last:
+                self.bars[(count - 1) % self.capacity] = rec
+            else:
+                self.bars[count % self.capacity] = rec
+                count += 1
+                last = int(rec["ts"])
+        self.header[_COUNT] = count
+        self.header[_LAST_WRITE] = time.time_ns()
+        self.header[_SEQ] += 1  # 짝수: 쓰기 완료
+
+    # 최근 n 개 봉 (시간 순, 복사본)
+    # 복사를 seq 확인 구간 안에서 끝내야 확인 후 쓰기가 돌려준 값을 바꾸지 못한다.
+    # 쓰는 중이면 CPU 를 양보하면서 조금씩 더 기다린다.
+    def latest(self, n=None, retries=100):
+        for attempt in range(retries):
+            seq = int(self.header[_SEQ])
+            if seq % 2 == 0:
+                count = int(self.header[_COUNT])
+                size = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+                start = (count - size) % self.capacity
+                if start + size <= self.capacity:
+                    out = self.bars[start:start + size].copy()
+                else:
+                    out = np.concatenate([self.bars[start:], self.bars[:start + size - self.capacity]])
+                if int(self.header[_SEQ]) == seq:
+                    return out
+            time.sleep(0 if attempt < 10 else min(0.001 * (attempt - 9), 0.01))
+        raise RuntimeError("링 버퍼를 읽는 동안 쓰기가 계속되어 스냅샷을 얻지 못했습니다.")
+
+
+def frame_to_records(df):
+    times = pd.DatetimeIndex(df["Datetime"] if "Datetime" in df.columns else df.index)
+    records = np.empty(len(df), dtype=BAR_DTYPE)
+    records["ts"] = times.tz_convert("UTC").as_unit("ns").asi8 if times.tz is not None else times.as_unit("ns").asi8
+    for field, col in (("open", "Open"), ("high", "High"), ("low", "Low"), ("close", "Close"), ("volume", "Volume")):
+        records[field] = df[col].to_numpy(dtype=float) if col in df.columns else np.nan
+    return records
+
+
+# CandleStore.get 과 같은 형태의 DataFrame 으로 변환 (차트 / 시뮬레이터용)
+def records_to_frame(records, tz="Asia/Seoul"):
+    return pd.DataFrame({
+        "Datetime": pd.to_datetime(records["ts"], utc=True).tz_convert(tz),
+        "Open": records["open"],
+        "High": records["high"],
+        "Low": records["low"],
+        "Close": records["close"],
+        "Volume": records["volume"],
+    })
+
+
+# 링 버퍼를 먼저 읽고, 없거나 오래되었으면 원래 저장소(네트워크)로 넘어가는 캔들 저장소
+class RingCandleStore:
+    def __init__(self, root=None, fallback=None, max_age=180, tz="Asia/Seoul"):
+        self.root = root or default_root()
+        self.fallback = fallback
+        self.max_age = max_age  # collector 가 이 시간(초) 이상 쓰지 않았으면 사용하지 않음
+        self.tz = tz
+        self._rings = {}
+
+    def ring(self, ticker, interval="1m"):
+        key = (ticker, interval)
+        if key not in self._rings or self._rings[key] is None:
+            try:
+                self._rings[key] = BarRing.open(self.root, ticker, interval)
+            except (OSError, ValueError):
+                self._rings[key] = None
+        return self._rings[key]
+
+    def is_fresh(self, ring):
+        return ring is not None and ring.count and time.time_ns() - ring.last_write < self.max_age * 1e9
+
+    def get(self, ticker, interval="1m", lookback="1d"):
+        ring = self.ring(ticker, interval)
+        records = None
+        if self.is_fresh(ring):
+            try:
+                records = ring.latest()
+            except RuntimeError as e:
+                print(f"{ticker} 링 버퍼 읽기 실패, 네트워크로 대체: {e}")
+        if records is not None:
+            if lookback == "1d":
+                # 마지막 봉과 같은 거래일(뉴욕 기준)의 봉만
+                days = pd.to_datetime(records["ts"], utc=True).tz_convert("America/New_York").normalize()
+                records = records[np.asarray(days == days[-1])]
+            return records_to_frame(records, self.tz)
+        if self.fallback is not None:
+            return self.fallback.get(ticker, interval=interval, lookback=lookback)
+        return pd.DataFrame()
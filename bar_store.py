@@ -0,0 +1,376 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+
+# 종목 / 간격별 열(column) 파일로 봉을 쌓아두는 로컬 저장소
+#   {root}/{ticker}/{interval}/ts.i8, open.f8, high.f8, low.f8, close.f8, volume.f8  (UTC epoch 나노초 + 값)
+#   {root}/{ticker}/{interval}/day.i8, day_start.i8                                  (거래일 → 첫 행 번호)
+# - 파일은 뒤에만 덧붙이고(진행 중인 마지막 봉만 제자리 갱신), 읽을 때는 memmap 으로 열어 필요한 구간만 메모리에 올라온다
+# - ts 파일을 마지막에 쓰므로 ts 의 길이가 확정된 행 수다 (쓰는 도중 죽어도 읽는 쪽은 완성된 행만 본다)
+FIELDS = ("open", "high", "low", "close", "volume")
+COLUMNS = {"Open": "open", "High": "high", "Low": "low", "Close": "close", "Volume": "volume"}
+NS_PER_DAY = 86_400 * 10 ** 9
+
+
+def default_root():
+    return os.getenv("BAR_STORE_DIR") or os.path.join(os.path.expanduser("~"), ".as_project", "bars")
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _memmap(path, dtype, count):
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+# 한 종목 / 간격의 열 파일 묶음 (읽기 전용 memmap)
+class BarColumns:
+    def __init__(self, path):
+        self.path = path
+        self.meta = _read_meta(path)
+        ts_path = os.path.join(path, "ts.i8")
+        self.count = os.path.getsize(ts_path) // 8 if os.path.exists(ts_path) else 0
+        self.ts = _memmap(ts_path, "<i8", self.count)
+        self.fields = {f: _memmap(os.path.join(path, f"{f}.f8"), "<f8", self.count) for f in FIELDS}
+        day_path = os.path.join(path, "day.i8")
+        n_days = os.path.getsize(day_path) // 8 if os.path.exists(day_path) else 0
+        self.days = _memmap(day_path, "<i8", n_days)  # 거래일 (거래소 시간대 기준 epoch 일수)
+        self.day_start = _memmap(os.path.join(path, "day_start.i8"), "<i8", n_days)
+
+    @property
+    def tz(self):
+        return self.meta.get("tz", "UTC")
+
+    # [start, end) 시각 구간의 행 범위 (이진 탐색)
+    def rows(self, start=None, end=None):
+        lo = 0 if start is None else int(np.searchsorted(self.ts, _to_ns(start), side="left"))
+        hi = self.count if end is None else int(np.searchsorted(self.ts, _to_ns(end), side="left"))
+        return lo, max(lo, hi)
+
+    # 거래일 구간 [first_day, last_day] 의 행 범위 (day 는 date 또는 Timestamp)
+    def day_rows(self, first_day=None, last_day=None):
+        lo_day = 0 if first_day is None else int(np.searchsorted(self.days, _day_number(first_day), side="left"))
+        hi_day = len(self.days) if last_day is None else int(np.searchsorted(self.days, _day_number(last_day), side="right"))
+        lo = int(self.day_start[lo_day]) if lo_day < len(self.days) else self.count
+        hi = int(self.day_start[hi_day]) if hi_day < len(self.days) else self.count
+        return lo, max(lo, hi)
+
+    # 최근 n 거래일의 행 범위
+    def last_days_rows(self, n):
+        if len(self.days) == 0:
+            return 0, 0
+        return int(self.day_start[max(len(self.days) - n, 0)]), self.count
+
+    # 복사 없는 열 뷰
+    def slice(self, lo, hi):
+        out = {"ts": self.ts[lo:hi]}
+        out.update({f: self.fields[f][lo:hi] for f in FIELDS})
+        return out
+
+    # yfinance 와 같은 형태의 DataFrame (이 단계에서는 복사가 일어난다)
+    def frame(self, lo, hi):
+        view = self.slice(lo, hi)
+        index = pd.DatetimeIndex(pd.to_datetime(view["ts"], utc=True)).tz_convert(self.tz)
+        index.name = self.meta.get("index_name", "Datetime")
+        return pd.DataFrame({col: view[f] for col, f in COLUMNS.items()}, index=index)
+
+
+def _to_ns(value):
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.value
+
+
+def _day_number(day):
+    return (pd.Timestamp(day).normalize().tz_localize(None) - pd.Timestamp(0)).days if not isinstance(day, (int, np.integer)) else int(day)
+
+
+class BarStore:
+    def __init__(self, root=None):
+        self.root = root or default_root()
+        self._cache = {}  # (ticker, interval) -> (ts 파일 크기, BarColumns)
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def path(self, ticker, interval):
+        return os.path.join(self.root, ticker, interval)
+
+    def _lock(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    # 메모리 맵을 연다. 파일이 늘어났을 때만 다시 연다 (열기 자체는 데이터를 읽지 않음).
+    def columns(self, ticker, interval="1m"):
+        key = (ticker, interval)
+        path = self.path(ticker, interval)
+        ts_path = os.path.join(path, "ts.i8")
+        size = os.path.getsize(ts_path) if os.path.exists(ts_path) else 0
+        cached = self._cache.get(key)
+        if cached is None or cached[0] != size:
+            cached = (size, BarColumns(path))
+            self._cache[key] = cached
+        return cached[1]
+
+    def slice(self, ticker, interval="1m", start=None, end=None):
+        cols = self.columns(ticker, interval)
+        return cols.slice(*cols.rows(start, end))
+
+    def frame(self, ticker, interval="1m", start=None, end=None):
+        cols = self.columns(ticker, interval)
+        return cols.frame(*cols.rows(start, end))
+
+    def last_ts(self, ticker, interval="1m"):
+        cols = self.columns(ticker, interval)
+        return pd.Timestamp(int(cols.ts[-1]), tz="UTC").tz_convert(cols.tz) if cols.count else None
+
+    def first_ts(self, ticker, interval="1m"):
+        cols = self.columns(ticker, interval)
+        return pd.Timestamp(int(cols.ts[0]), tz="UTC").tz_convert(cols.tz) if cols.count else None
+
+    # yfinance 형태의 DataFrame 을 덧붙인다. 마지막 봉과 같은 시각은 진행 중인 봉으로 보고 덮어쓴다.
+    # 저장된 첫 봉보다 이전 데이터가 들어오면 합쳐서 파일을 다시 쓴다 (드문 경우).
+    def append(self, ticker, interval, df, extra_meta=None):
+        if df is None or df.empty:
+            return 0
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is None:
+            index = index.tz_localize("UTC")
+        ts = index.tz_convert("UTC").as_unit("ns").asi8
+        values = {f: df[col].to_numpy(dtype="<f8") if col in df.columns else np.full(len(df), np.nan)
+                  for col, f in COLUMNS.items()}
+
+        with self._lock((ticker, interval)):
+            path = self.path(ticker, interval)
+            os.makedirs(path, exist_ok=True)
+            cols = self.columns(ticker, interval)
+            meta = dict(cols.meta, tz=str(index.tz), index_name=df.index.name or "Datetime", **(extra_meta or {}))
+
+            if cols.count and ts[0] < cols.ts[0]:
+                return self._rewrite(ticker, interval, cols, ts, values, meta)
+
+            self._truncate(path, cols)
+            last = int(cols.ts[-1]) if cols.count else None
+            if last is not None:
+                same = np.flatnonzero(ts == last)
+                if len(same):
+                    # 진행 중이던 마지막 봉 제자리 갱신
+                    row = cols.count - 1
+                    for f in FIELDS:
+                        mm = np.memmap(os.path.join(path, f"{f}.f8"), dtype="<f8", mode="r+", shape=(cols.count,))
+                        mm[row] = values[f][same[-1]]
+                        mm.flush()
+                        del mm
+                keep = ts > last
+                ts = ts[keep]
+                values = {f: v[keep] for f, v in values.items()}
+
+            if len(ts):
+                order = np.argsort(ts, kind="stable")
+                ts = ts[order]
+                values = {f: v[order] for f, v in values.items()}
+                self._write_days(path, cols, ts, meta["tz"])
+                for f in FIELDS:
+                    with open(os.path.join(path, f"{f}.f8"), "ab") as fh:
+                        fh.write(values[f].tobytes())
+                with open(os.path.join(path, "ts.i8"), "ab") as fh:
+                    fh.write(ts.tobytes())  # 마지막에 기록 (행 수 확정)
+            self._write_meta(path, meta)
+            self._cache.pop((ticker, interval), None)
+            return len(ts)
+
+    # 이전 기록이 ts 를 쓰기 전에 중단되었으면 확정되지 않은 값 / 날짜 항목을 잘라낸다
+    def _truncate(self, path, cols):
+        for f in FIELDS:
+            target = os.path.join(path, f"{f}.f8")
+            if os.path.exists(target) and os.path.getsize(target) != cols.count * 8:
+                os.truncate(target, cols.count * 8)
+        n_days = int(np.searchsorted(cols.day_start, cols.count, side="left")) if len(cols.days) else 0
+        for name in ("day.i8", "day_start.i8"):
+            target = os.path.join(path, name)
+            if os.path.exists(target) and os.path.getsize(target) != n_days * 8:
+                os.truncate(target, n_days * 8)
+        if n_days != len(cols.days):
+            cols.days, cols.day_start = cols.days[:n_days], cols.day_start[:n_days]
+
+    def _write_days(self, path, cols, ts, tz, base=None):
+        local = pd.to_datetime(ts, utc=True).tz_convert(tz).tz_localize(None).normalize()
+        numbers = ((local - pd.Timestamp(0)) // pd.Timedelta(days=1)).to_numpy(dtype="<i8")
+        start_row = cols.count if base is None else base
+        boundaries = np.r_[0, np.flatnonzero(np.diff(numbers)) + 1]
+        days, starts = numbers[boundaries], boundaries + start_row
+        if base is None and len(cols.days) and days[0] == cols.days[-1]:
+            days, starts = days[1:], starts[1:]  # 이미 기록된 날의 이어지는 봉
+        with open(os.path.join(path, "day_start.i8"), "ab") as fh:
+            fh.write(starts.astype("<i8").tobytes())
+        with open(os.path.join(path, "day.i8"), "ab") as fh:
+            fh.write(days.astype("<i8").tobytes())
+
+    def _rewrite(self, ticker, interval, cols, ts, values, meta):
+        old = cols.slice(0, cols.count)
+        merged_ts = np.concatenate([ts, np.asarray(old["ts"])])
+        _, first = np.unique(merged_ts, return_index=True)  # 같은 시각이면 새 값 우선
+        merged = {f: np.concatenate([values[f], np.asarray(old[f])])[first] for f in FIELDS}
+        merged_ts = merged_ts[first]
+        path = self.path(ticker, interval)
+        self._cache.pop((ticker, interval), None)
+        del cols, old
+        for name in ("ts.i8", "day.i8", "day_start.i8") + tuple(f"{f}.f8" for f in FIELDS):
+            target = os.path.join(path, name)
+            if os.path.exists(target):
+                os.remove(target)
+        empty = BarColumns(path)
+        self._write_days(path, empty, merged_ts, meta["tz"], base=0)
+        for f in FIELDS:
+            with open(os.path.join(path, f"{f}.f8"), "wb") as fh:
+                fh.write(merged[f].tobytes())
+        with open(os.path.join(path, "ts.i8"), "wb") as fh:
+            fh.write(merged_ts.tobytes())
+        self._write_meta(path, meta)
+        return len(ts)
+
+    def _write_meta(self, path, meta):
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    def update_meta(self, ticker, interval, **values):
+        with self._lock((ticker, interval)):
+            path = self.path(ticker, interval)
+            os.makedirs(path, exist_ok=True)
+            self._write_meta(path, dict(_read_meta(path), **values))
+            self._cache.pop((ticker, interval), None)
+
+    def tickers(self):
+        return sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+
+
+_default_store = None
+_default_store_guard = threading.Lock()
+
+
+# BAR_STORE_DIR 을 지정했을 때만 사용하는 프로세스 전역 저장소 (없으면 None)
+def get_bar_store():
+    global _default_store
+    with _default_store_guard:
+        if _default_store is None and os.getenv("BAR_STORE_DIR"):
+            _default_store = BarStore()
+        return _default_store
+
+
+PERIOD_DAYS = {"1d": 1, "5d": 5, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827, "10y": 3653}
+
+# yfinance 분봉 제한 (일): 한 번에 받을 수 있는 기간 / 지금부터 거슬러 받을 수 있는 기간
+REQUEST_SPAN_DAYS = {"1m": 7, "2m": 59, "5m": 59, "15m": 59, "30m": 59, "60m": 729, "90m": 59, "1h": 729}
+LOOKBACK_DAYS = {"1m": 29, "2m": 59, "5m": 59, "15m": 59, "30m": 59, "60m": 729, "90m": 59, "1h": 729}
+
+
+# MarketDataCache 의 데이터 소스로 끼워 쓰는 저장소 계층
+# 저장된 봉은 디스크에서 읽고, 마지막 저장 시각 이후만 원래 소스(yfinance)에 요청해서 덧붙인다.
+# - meta["covered_from"]: 이 시각 이후는 빠짐없이 저장되어 있음 (기간 요청으로 받은 구간의 시작)
+# - meta["gaps"]: 오래 멈춰 있던 사이 yfinance 제한 때문에 채우지 못한 구간 [시작, 끝) (UTC ns)
+#   요청 구간이 빈 구간과 겹치면 저장소 대신 원래 요청을 그대로 보낸다.
+class BarStoreSource:
+    def __init__(self, store=None, upstream=None, clock=None):
+        from market_data import YFinanceSource
+        self.store = store or BarStore()
+        self.upstream = upstream or YFinanceSource()
+        self.clock = clock or (lambda: pd.Timestamp.now(tz="UTC"))
+
+    def info(self, ticker):
+        return self.upstream.info(ticker)
+
+    def _covered_from(self, cols):
+        covered = cols.meta.get("covered_from")
+        first = int(cols.ts[0]) if cols.count else None
+        if covered is None:
+            return first
+        return covered if first is None else min(covered, first)
+
+    def _has_gap(self, cols, lo, hi):
+        return any(g_lo < hi and g_hi > lo for g_lo, g_hi in cols.meta.get("gaps", []))
+
+    # 요청이 원하는 구간의 시작 (UTC ns). None 이면 저장소로 판단할 수 없는 요청.
+    def _wanted(self, period, start, now):
+        if start is not None:
+            return _to_ns(start)
+        if period == "max":
+            return None
+        days = PERIOD_DAYS.get(period or "1mo")
+        return (now - pd.Timedelta(days=days)).value if days is not None else None
+
+    def history(self, ticker, period=None, interval="1d", start=None, end=None):
+        store = self.store
+        now = self.clock()
+        cols = store.columns(ticker, interval)
+        want = self._wanted(period, start, now)
+        if cols.count:
+            covered = cols.meta.get("max") if start is None and period == "max" else (
+                want is not None and self._covered_from(cols) <= want)
+            if covered:
+                try:
+                    self._refresh(ticker, interval, now)
+                except Exception as e:
+                    print(f"저장소 갱신 실패, 원래 요청으로 대체: {ticker} {interval} - {e}")
+                else:
+                    cols = store.columns(ticker, interval)
+                    hi = _to_ns(end) if end is not None else now.value
+                    if not self._has_gap(cols, want or 0, hi):
+                        if start is None and period == "1d":
+                            return cols.frame(*cols.last_days_rows(1))  # yfinance 처럼 마지막 거래일
+                        return cols.frame(*cols.rows(None if want is None else pd.Timestamp(want, tz="UTC"), end))
+
+        # 저장된 범위로 부족하면 원래 요청을 그대로 보내고 결과를 저장
+        df = self.upstream.history(ticker, period=period, interval=interval, start=start, end=end)
+        if df is None or df.empty:
+            return df
+        previous_last = int(cols.ts[-1]) if cols.count else None
+        store.append(ticker, interval, df)
+        if end is None:
+            meta = {}
+            if period == "max" and start is None:
+                meta["max"] = True
+            elif want is not None:
+                # 받은 구간이 기존 봉과 이어지면 기존 시작부터, 아니면 이번 요청 시작부터 빠짐없이 저장된 것
+                covered = self._covered_from(cols) if previous_last is not None and previous_last >= want else None
+                meta["covered_from"] = min(covered, want) if covered is not None else want
+            if meta:
+                store.update_meta(ticker, interval, **meta)
+        return df
+
+    # 마지막 저장 봉 이후만 받아서 덧붙인다
+    # yfinance 가 한 번에 내주는 기간씩 나눠 받고, 거슬러 받을 수 없을 만큼 오래된 구간은 빈 구간으로 기록한다.
+    def _refresh(self, ticker, interval, now=None):
+        now = now or self.clock()
+        last = self.store.last_ts(ticker, interval)
+        if last is None:
+            return
+        start = last.tz_convert("UTC")
+        lookback = LOOKBACK_DAYS.get(interval)
+        if lookback is not None and start < now - pd.Timedelta(days=lookback):
+            oldest = now - pd.Timedelta(days=lookback)
+            gaps = self.store.columns(ticker, interval).meta.get("gaps", [])
+            self.store.update_meta(ticker, interval, gaps=gaps + [[start.value, oldest.value]])
+            print(f"{ticker} {interval}: {start} ~ {oldest} 구간은 받을 수 없어 빈 구간으로 기록")
+            start = oldest
+
+        span = REQUEST_SPAN_DAYS.get(interval)
+        while True:
+            chunk_end = start + pd.Timedelta(days=span) if span is not None else None
+            if chunk_end is None or chunk_end >= now:
+                self.store.append(ticker, interval, self.upstream.history(ticker, interval=interval, start=start))
+                return
+            self.store.append(ticker, interval,
+                              self.upstream.history(ticker, interval=interval, start=start, end=chunk_end))
+            start = chunk_end
@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault("OPEN_AI_API_KEY", "benchmark")  # 스텁 클라이언트를 쓰므로 실제 키는 필요 없음
+
+from ai import StockDecisionAI
+from candle_store import CandleStore
+from market_data import MarketDataCache
+from prompts import build_messages
+from simulation import StockSimulator
+
+
+# StockSimulator 한 틱의 단계별 소요 시간 / 메모리 / 처리량 측정
+#   python benchmark.py --record NVDA AAPL        # yfinance 에서 받아 benchmark_fixtures/ 에 저장
+#   python benchmark.py --save-baseline           # 측정 결과를 기준값으로 저장
+#   python benchmark.py --compare                 # 기준값과 비교 (느려진 단계가 있으면 종료 코드 1)
+#   python benchmark.py --check                   # 이력 형태별 프롬프트 생성만 확인 (측정 전에도 항상 실행)
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_fixtures")
+BASELINE_PATH = os.path.join(FIXTURE_DIR, "baseline.json")
+STAGES = ["fetch", "intraday", "daily", "prompt", "llm", "parse", "handle", "total"]
+STUB_DECISION = {
+    "reason": "벤치마크 스텁 응답",
+    "risk_type": "안정적",
+    "action": "buy",
+    "quantity": 1,
+    "price": 0.0,
+}
+
+
+def fixture_path(ticker, kind):
+    return os.path.join(FIXTURE_DIR, f"{ticker}_{kind}.pkl")
+
+
+# 실제 시세를 받아서 저장 (1분봉 하루치 + 일봉 1년치)
+def record(tickers):
+    from market_data import YFinanceSource
+    source = YFinanceSource()
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for ticker in tickers:
+        source.history(ticker, period="1d", interval="1m").to_pickle(fixture_path(ticker, "1m"))
+        source.history(ticker, period="1y", interval="1d").to_pickle(fixture_path(ticker, "1d"))
+        print(f"💾 {ticker} 저장 완료")
+
+
+# 저장된 데이터가 없을 때 쓰는 합성 시세 (종목 이름으로 시드 고정)
+def synthetic_frames(ticker):
+    rng = np.random.default_rng(sum(map(ord, ticker)))
+    minute_index = pd.date_range("2025-06-02 09:30", periods=390, freq="1min", tz="America/New_York")
+    daily_index = pd.bdate_range(end="2025-05-30", periods=252, tz="America/New_York")
+
+    def frame(index, sigma):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, sigma, len(index))))
+        spread = close * sigma
+        return pd.DataFrame({
+            "Open": close - rng.normal(0, spread),
+            "High": close + np.abs(rng.normal(0, spread)),
+            "Low": close - np.abs(rng.normal(0, spread)),
+            "Close": close,
+            "Volume": rng.integers(1_000, 100_000, len(index)).astype(float),
+        }, index=index)
+
+    minute, daily = frame(minute_index, 0.001), frame(daily_index, 0.02)
+    minute.index.name, daily.index.name = "Datetime", "Date"
+    return minute, daily
+
+
+def load_frames(ticker):
+    if os.path.exists(fixture_path(ticker, "1m")) and os.path.exists(fixture_path(ticker, "1d")):
+        return pd.read_pickle(fixture_path(ticker, "1m")), pd.read_pickle(fixture_path(ticker, "1d")), "fixture"
+    minute, daily = synthetic_frames(ticker)
+    return minute, daily, "synthetic"
+
+
+# 저장된 시세를 재생하는 데이터 소스. advance() 할 때마다 1분봉이 하나씩 늘어난다 (실시간과 같은 증분 요청 경로).
+class FixtureSource:
+    def __init__(self, frames, start_bars=30):
+        self.frames = frames  # ticker -> (1분봉, 일봉)
+        self.cursor = {ticker: start_bars for ticker in frames}
+
+    def advance(self, ticker):
+        minute = self.frames[ticker][0]
+        self.cursor[ticker] = self.cursor[ticker] % len(minute) + 1
+
+    def history(self, ticker, period=None, interval="1d", start=None, end=None):
+        minute, daily = self.frames[ticker]
+        if interval == "1d":
+            return daily
+        df = minute.iloc[:self.cursor[ticker]]
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start)]
+        return df
+
+    def info(self, ticker):
+        return {"longName": ticker}
+
+
+# OpenAI 클라이언트 스텁: 호출/응답 시각을 남겨서 프롬프트 생성 / 응답 대기 / 파싱 구간을 나눈다
+class StubOpenAIClient:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.chat = self
+        self.completions = self
+        self.called_at = None
+        self.returned_at = None
+
+    def create(self, model, messages, **kwargs):
+        self.called_at = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        content = "```json\n" + json.dumps(STUB_DECISION, ensure_ascii=False) + "\n```"
+        message = type("Message", (), {"content": content})()
+        completion = type("Completion", (), {"choices": [type("Choice", (), {"message": message})()]})()
+        self.returned_at = time.perf_counter()
+        return completion
+
+
+def timed(method, spans, name):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            spans[name] = (started, time.perf_counter())
+    return wrapper
+
+
+def elapsed(span):
+    return span[1] - span[0]
+
+
+class Bench:
+    def __init__(self, tickers, llm_latency=0.0):
+        self.frames = {}
+        self.sources = {}
+        for ticker in tickers:
+            minute, daily, kind = load_frames(ticker)
+            self.frames[ticker] = (minute, daily)
+            self.sources[ticker] = kind
+        self.source = FixtureSource(self.frames)
+        self.market_data = MarketDataCache(source=self.source)
+        self.llm_latency = llm_latency
+
+    def simulator(self, ticker):
+        # 종목마다 클라이언트를 따로 두어 호출 시각이 섞이지 않게 한다
+        client = StubOpenAIClient(self.llm_latency)
+        decision_ai = StockDecisionAI(client=client)
+        sim = StockSimulator(
+            ticker=ticker,
+            initial_money=10 ** 9,
+            candle_store=CandleStore(market_data=self.market_data),
+            market_data=self.market_data,
+            decision_ai=decision_ai,
+        )
+        # step() 이 부르는 단계 메서드를 감싸서 (시작, 끝) 시각만 남긴다 (실행 경로는 그대로)
+        sim.bench_spans = {}
+        for name in ("get_live_candles", "get_ma_recent", "get_ma_1y", "decide", "handle_decision"):
+            setattr(sim, name, timed(getattr(sim, name), sim.bench_spans, name))
+        return sim, client
+
+    # 실제 StockSimulator.step() (collect → decide → handle_decision) 을 한 번 실행하고 단계별 시간(초)을 나눈다
+    def tick(self, sim, client):
+        self.source.advance(sim.ticker)
+        sim.bench_spans.clear()
+        t0 = time.perf_counter()
+        if sim.step() is None:
+            raise RuntimeError(f"{sim.ticker} 틱에서 데이터를 받지 못했습니다.")
+        t1 = time.perf_counter()
+        spans = sim.bench_spans
+        decide_start, decide_end = spans["decide"]
+        return {
+            "fetch": elapsed(spans["get_live_candles"]),
+            "intraday": elapsed(spans["get_ma_recent"]),
+            "daily": elapsed(spans["get_ma_1y"]),
+            "prompt": client.called_at - decide_start,
+            "llm": client.returned_at - client.called_at,
+            "parse": decide_end - client.returned_at,
+            "handle": elapsed(spans["handle_decision"]),
+            "total": t1 - t0,
+        }
+
+    def latency(self, ticks):
+        samples = {stage: [] for stage in STAGES}
+        for ticker in self.frames:
+            sim, client = self.simulator(ticker)
+            self.tick(sim, client)  # 첫 틱은 전체 다운로드 / 캐시 준비라 제외
+            for _ in range(ticks):
+                for stage, value in self.tick(sim, client).items():
+                    samples[stage].append(value)
+        return {stage: summarize(values) for stage, values in samples.items()}
+
+    # 틱 하나가 새로 할당하는 메모리 (tracemalloc 은 느리므로 시간 측정과 따로 돌린다)
+    def memory(self, ticks):
+        ticker = next(iter(self.frames))
+        sim, client = self.simulator(ticker)
+        self.tick(sim, client)
+        peaks, retained = [], []
+        tracemalloc.start()
+        try:
+            for _ in range(ticks):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                self.tick(sim, client)
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(current - before)
+        finally:
+            tracemalloc.stop()
+        return {
+            "peak_kb_mean": statistics.fmean(peaks) / 1024,
+            "peak_kb_max": max(peaks) / 1024,
+            "retained_kb_mean": statistics.fmean(retained) / 1024,
+        }
+
+    # 종목 N 개를 스레드 풀로 동시에 한 틱씩 돌렸을 때 초당 처리 틱 수
+    def throughput(self, n_tickers, ticks, workers=16):
+        base = list(self.frames)
+        names = [f"{base[i % len(base)]}#{i}" for i in range(n_tickers)]
+        for name in names:
+            self.frames[name] = self.frames[name.split("#")[0]]
+            self.source.cursor[name] = 30
+        pairs = [self.simulator(name) for name in names]
+        with ThreadPoolExecutor(max_workers=min(workers, n_tickers)) as pool:
+            list(pool.map(lambda p: self.tick(*p), pairs))
+            started = time.perf_counter()
+            for _ in range(ticks):
+                list(pool.map(lambda p: self.tick(*p), pairs))
+            elapsed = time.perf_counter() - started
+        for name in names:
+            del self.frames[name]
+            del self.source.cursor[name]
+        return {"tickers": n_tickers, "ticks_per_sec": n_tickers * ticks / elapsed, "sec_per_round": elapsed / ticks}
+
+
+# 호출 측마다 이력을 넘기는 형태가 달라서 (Series / ndarray / list / 문자열) 모두 프롬프트가 만들어지는지 확인
+def check_prompts():
+    minute, daily = synthetic_frames("CHECK")
+    hist_1y, hist_10m = daily["Close"], minute["Close"].iloc[-10:]
+    inputs = {
+        "market": "US", "company_name": "CHECK", "current_price": float(hist_10m.iloc[-1]),
+        "current_count": 0, "current_money": 1000.0, "ma_5m": None, "ma_20m": None, "ma_5d": None,
+        "ma_20d": None, "prev_res": "hold", "indicators": None, "avg_cost": None,
+    }
+    cases = {
+        "series": (hist_1y, hist_10m),
+        "ndarray": (hist_1y.to_numpy(), hist_10m.to_numpy()),
+        "list": (hist_1y.to_list(), hist_10m.to_list()),
+        "str": (str(hist_1y.round(2).to_list()), "최근 10분간 보합"),
+    }
+    for label, (hist_1y, hist_10m) in cases.items():
+        messages, stats = build_messages(dict(inputs, price_hist_1y=hist_1y, price_hist_10m=hist_10m))
+        if len(messages) != 4 or stats["request_tokens"] <= 0:
+            raise AssertionError(f"{label} 이력으로 프롬프트를 만들지 못했습니다: {stats}")
+    return list(cases)
+
+
+def summarize(values):
+    values = np.asarray(values) * 1000  # ms
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "max_ms": float(values.max()),
+    }
+
+
+def run(tickers, ticks, throughput_sizes, llm_latency):
+    bench = Bench(tickers, llm_latency)
+    return {
+        "data": bench.sources,
+        "ticks": ticks,
+        "llm_latency": llm_latency,
+        "latency": bench.latency(ticks),
+        "memory": bench.memory(min(ticks, 50)),
+        "throughput": [bench.throughput(n, max(ticks // 10, 3)) for n in throughput_sizes],
+    }
+
+
+def print_report(result, baseline=None, threshold=0.2):
+    regressions = []
+    print(f"데이터: {result['data']}, 틱 {result['ticks']}회, LLM 지연 {result['llm_latency']}s")
+    print(f"{'단계':<10}{'평균':>10}{'p50':>10}{'p95':>10}{'최대':>10}{'기준 대비':>12}")
+    for stage in STAGES:
+        row = result["latency"][stage]
+        change = ""
+        if baseline and stage in baseline.get("latency", {}):
+            base = baseline["latency"][stage]["p50_ms"]
+            ratio = row["p50_ms"] / base - 1 if base > 0 else 0.0
+            change = f"{ratio * 100:+.0f}%"
+            if ratio > threshold and row["p50_ms"] - base > 0.05:  # 0.05ms 미만 차이는 잡음으로 본다
+                regressions.append(stage)
+                change += " ⚠️"
+        print(f"{stage:<10}{row['mean_ms']:>10.3f}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}{row['max_ms']:>10.3f}{change:>12}")
+
+    mem = result["memory"]
+    print(f"메모리/틱: 최대 {mem['peak_kb_max']:.1f}KB, 평균 최대 {mem['peak_kb_mean']:.1f}KB, 평균 잔류 {mem['retained_kb_mean']:.1f}KB")
+    for row in result["throughput"]:
+        print(f"처리량: 종목 {row['tickers']}개 → {row['ticks_per_sec']:.1f} 틱/초 (한 바퀴 {row['sec_per_round'] * 1000:.1f}ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="시뮬레이션 틱 벤치마크")
+    parser.add_argument("tickers", nargs="*", default=["NVDA", "AAPL"])
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--throughput", type=int, nargs="*", default=[1, 10, 50], help="동시에 돌릴 종목 수")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="스텁 LLM 응답 지연 (초)")
+    parser.add_argument("--record", action="store_true", help="yfinance 에서 받아 fixture 로 저장")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="이 비율 이상 느려지면 회귀로 판단")
+    parser.add_argument("--check", action="store_true", help="프롬프트 생성 확인만 하고 종료")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.tickers)
+        return
+    print(f"✅ 프롬프트 생성 확인: {', '.join(check_prompts())}")
+    if args.check:
+        return
+
+    result = run(args.tickers, args.ticks, args.throughput, args.llm_latency)
+    baseline = None
+    if args.compare and os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = print_report(result, baseline, args.threshold)
+
+    if args.save_baseline:
+        os.makedirs(FIXTURE_DIR, exist_ok=True)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 기준값 저장: {BASELINE_PATH}")
+    if regressions:
+        print(f"❗ 기준값보다 느려진 단계: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
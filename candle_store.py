@@ -0,0 +1,96 @@
+import threading
+import pandas as pd
+from market_data import get_market_data
+
+
+# 티커별 캔들 저장소
+# 이미 받은 봉은 보관하고, 마지막으로 저장된 시각 이후의 봉만 새로 요청한다.
+# 아직 만들어지는 중인 마지막 봉은 새로 받은 값으로 덮어쓴다.
+class CandleStore:
+    def __init__(self, tz="Asia/Seoul", market_data=None):
+        self.tz = tz
+        self.market_data = market_data
+        self._frames = {}    # (ticker, interval, lookback) -> DataFrame
+        self._sessions = {}  # (ticker, interval, lookback) -> 마지막 봉의 거래일 (거래소 기준)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def _fetch(self, ticker, interval, lookback, start=None):
+        market_data = self.market_data or get_market_data()
+        if start is None:
+            return market_data.history(ticker, period=lookback, interval=interval)
+        return market_data.history(ticker, interval=interval, start=start)
+
+    # 새로 받은 봉에만 인덱스 해제 / 시간대 변환을 적용
+    def _normalize(self, raw):
+        df = raw.reset_index()
+        df.rename(columns={df.columns[0]: "Datetime"}, inplace=True)
+        df["Datetime"] = pd.to_datetime(df["Datetime"])
+        df["Datetime"] = df["Datetime"].dt.tz_convert(self.tz)
+        return df
+
+    def _merge(self, key, frame, raw):
+        lookback = key[2]
+        session = raw.index[-1].date()
+
+        # 하루치만 보관하는 경우 거래일이 바뀌면 이전 봉은 버린다
+        if frame is not None and lookback == "1d" and session != self._sessions.get(key):
+            frame = None
+            raw = raw[raw.index.date == session]
+        self._sessions[key] = session
+
+        new = self._normalize(raw)
+        if frame is None or frame.empty:
+            return new
+
+        # 새 봉의 첫 시각 이후(진행 중이던 봉 포함)는 새 값으로 교체
+        cut = frame["Datetime"].searchsorted(new["Datetime"].iloc[0])
+        return pd.concat([frame.iloc[:cut], new], ignore_index=True)
+
+    def get(self, ticker, interval="1m", lookback="1d"):
+        key = (ticker, interval, lookback)
+        with self._lock_for(key):
+            frame = self._frames.get(key)
+            try:
+                if frame is None or frame.empty:
+                    raw = self._fetch(ticker, interval, lookback)
+                else:
+                    raw = self._fetch(ticker, interval, lookback, start=frame["Datetime"].iloc[-1])
+            except Exception:
+                raw = None
+
+            if raw is not None and not raw.empty:
+                frame = self._merge(key, frame, raw)
+                self._frames[key] = frame
+
+            if frame is None:
+                return pd.DataFrame()
+            return frame.copy()
+
+    def clear(self, ticker=None):
+        with self._locks_guard:
+            keys = [k for k in self._frames if ticker is None or k[0] == ticker]
+        for key in keys:
+            self._frames.pop(key, None)
+            self._sessions.pop(key, None)
+
+
+_default_store = None
+_default_store_guard = threading.Lock()
+
+
+# 프로세스 전체에서 공유하는 저장소 (Streamlit 재실행 사이에도 유지)
+# collector.py 가 쓰는 공유 메모리 링 버퍼가 있으면 먼저 읽고, 없으면 네트워크로 받는다.
+def get_default_store():
+    global _default_store
+    with _default_store_guard:
+        if _default_store is None:
+            from bar_ring import RingCandleStore
+            _default_store = RingCandleStore(fallback=CandleStore())
+        return _default_store
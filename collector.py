@@ -0,0 +1,64 @@
+import argparse
+import time
+from bar_ring import BarRing, DEFAULT_CAPACITY, default_root, frame_to_records
+from candle_store import CandleStore
+
+
+# 별도 프로세스로 실행하는 시세 수집기
+# 설정한 종목들의 봉을 주기적으로 받아 종목별 공유 메모리 링 버퍼에 쓴다.
+# app.py / pre_market_analysis.py / StockSimulator 는 BAR_RING_DIR 을 통해 이 버퍼를 읽는다.
+#   python collector.py NVDA AAPL TSLA --interval 1m --poll 15
+class Collector:
+    def __init__(self, tickers, interval="1m", lookback="1d", root=None, capacity=DEFAULT_CAPACITY):
+        self.tickers = list(tickers)
+        self.interval = interval
+        self.lookback = lookback
+        self.root = root or default_root()
+        self.store = CandleStore(tz="UTC")  # 이미 받은 봉 이후만 요청
+        self.rings = {
+            ticker: BarRing.create(self.root, ticker, interval, capacity=capacity)
+            for ticker in self.tickers
+        }
+
+    def poll_once(self):
+        written = {}
+        for ticker, ring in self.rings.items():
+            try:
+                df = self.store.get(ticker, interval=self.interval, lookback=self.lookback)
+            except Exception as e:
+                print(f"[{ticker}] 수집 오류: {e}")
+                continue
+            if df.empty:
+                continue
+
+            records = frame_to_records(df)
+            last = ring.last_ts()
+            if last is not None:
+                records = records[records["ts"] >= last]  # 진행 중인 마지막 봉 + 새 봉만
+            ring.upsert(records)
+            written[ticker] = len(records)
+        return written
+
+    def run(self, poll=15):
+        print(f"📡 수집 시작: {', '.join(self.tickers)} ({self.interval}) → {self.root}")
+        while True:
+            started = time.monotonic()
+            self.poll_once()
+            time.sleep(max(0.0, poll - (time.monotonic() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="공유 메모리 링 버퍼 시세 수집기")
+    parser.add_argument("tickers", nargs="+")
+    parser.add_argument("--interval", default="1m")
+    parser.add_argument("--lookback", default="1d")
+    parser.add_argument("--poll", type=float, default=15, help="수집 주기 (초)")
+    parser.add_argument("--root", default=None, help="링 버퍼 디렉터리 (기본: BAR_RING_DIR 또는 /dev/shm)")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY)
+    args = parser.parse_args()
+
+    Collector(args.tickers, args.interval, args.lookback, args.root, args.capacity).run(args.poll)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+# 의사결정 백엔드는 모두 StockDecisionAI.get_stock_decision 과 같은 키워드 인자를 받고
+# {"reason", "risk_type", "action", "quantity", "price"} dict 를 돌려준다.
+# (StockDecisionAI, AsyncStockDecisionAI, GeminiDecisionAI, 백테스트용 소스, 아래 규칙 엔진)
+
+VALID_ACTIONS = ("buy", "sell", "hold")
+
+
+def _hold(price, reason):
+    return {"reason": reason, "risk_type": "안정적", "action": "hold", "quantity": 0, "price": price}
+
+
+# 프롬프트의 분할 매수/매도 규칙을 그대로 적용하는 로컬 규칙 엔진 (네트워크 없음)
+# 기준가(적정 주가)는 입력의 fair_value, 없으면 20일 이동 평균으로 대신한다.
+class RuleEngineDecisionAI:
+    def __init__(
+        self,
+        initial_money=1000,
+        levels=(0.9, 0.8, 0.7),
+        weights=(0.2, 0.3, 0.5),
+        take_profit=1.2,
+        resist_mult=1.05
+    ):
+        self.initial_money = initial_money
+        self.levels = tuple(levels)
+        self.weights = tuple(weights)
+        self.take_profit = take_profit
+        self.resist_mult = resist_mult
+
+    def sell_signal(self, current_price, current_count, avg_cost=None, ma_20d=None):
+        if current_count <= 0:
+            return None
+        if avg_cost and current_price >= avg_cost * self.take_profit:
+            return f"목표 수익률 도달 (현재가 {current_price:.2f} ≥ 평균 매입가 {avg_cost:.2f} × {self.take_profit})"
+        if ma_20d and current_price >= ma_20d * self.resist_mult:
+            return f"기술적 저항선 도달 (현재가 {current_price:.2f} ≥ MA20 {ma_20d:.2f} × {self.resist_mult})"
+        return None
+
+    def get_stock_decision(
+        self,
+        current_price,
+        current_count,
+        current_money,
+        ma_20d=None,
+        avg_cost=None,
+        fair_value=None,
+        **_inputs
+    ):
+        price = float(current_price)
+
+        reason = self.sell_signal(price, current_count, avg_cost, ma_20d)
+        if reason:
+            return {"reason": reason, "risk_type": "안정적", "action": "sell", "quantity": int(current_count), "price": price}
+
+        fair = fair_value or ma_20d
+        if not fair:
+            return _hold(price, "기준가를 계산할 데이터가 부족하여 홀드")
+
+        # 현재가가 도달한 가장 깊은 매수 단계까지의 누적 예산만큼 보유하도록 매수
+        reached = [k for k, level in enumerate(self.levels) if price <= fair * level]
+        if not reached:
+            return _hold(price, f"현재가 {price:.2f} 가 1차 매수 기준 {fair * self.levels[0]:.2f} 보다 높아 홀드")
+
+        stage = reached[-1]
+        target = self.initial_money * sum(self.weights[:stage + 1])
+        invested = current_count * (avg_cost or price)
+        budget = min(target - invested, current_money)
+        quantity = int(math.floor(budget / price)) if budget > 0 else 0
+        if quantity <= 0:
+            return _hold(price, f"{stage + 1}차 매수 예산을 이미 사용하여 홀드")
+
+        return {
+            "reason": f"{stage + 1}차 매수 조건 충족 (현재가 {price:.2f} ≤ 기준가 {fair:.2f} × {self.levels[stage]})",
+            "risk_type": "안정적",
+            "action": "buy",
+            "quantity": quantity,
+            "price": price,
+        }
+
+
+# LLM 응답이 규칙을 어겼는지 확인. (심각한 위반 목록, 경고 목록) 을 반환한다.
+def validate_decision(res, inputs, rules=None):
+    errors, warnings = [], []
+    if not isinstance(res, dict):
+        errors.append(f"응답이 dict 가 아님: {type(res).__name__}")
+        return errors, warnings
+    action = res.get("action")
+    if action not in VALID_ACTIONS:
+        errors.append(f"유효하지 않은 액션: {action}")
+        return errors, warnings
+
+    try:
+        quantity = int(res.get("quantity", 0))
+        price = float(res.get("price", inputs["current_price"]))
+    except (TypeError, ValueError):
+        errors.append("수량 또는 가격이 숫자가 아님")
+        return errors, warnings
+
+    if quantity < 0:
+        errors.append(f"음수 수량: {quantity}")
+    if action == "sell" and quantity > inputs["current_count"]:
+        errors.append(f"보유 수량({inputs['current_count']})보다 많은 매도: {quantity}")
+    if action == "buy" and price * quantity > inputs["current_money"]:
+        errors.append(f"보유 현금({inputs['current_money']:.2f})을 넘는 매수: {price * quantity:.2f}")
+
+    if action == "sell" and rules is not None:
+        signal = rules.sell_signal(
+            float(inputs["current_price"]), inputs["current_count"], inputs.get("avg_cost"), inputs.get("ma_20d")
+        )
+        if signal is None:
+            warnings.append("목표 수익률/기술적 저항선 도달 전 매도")
+    return errors, warnings
+
+
+# 주 백엔드(LLM)에 시간 제한을 두고, 실패·시간 초과·규칙 위반 시 대체 백엔드(규칙 엔진) 결과를 사용
+class FallbackDecisionAI:
+    _executor = None
+    _executor_guard = threading.Lock()
+
+    def __init__(self, primary, fallback=None, timeout=None, validate=True):
+        self.primary = primary
+        self.fallback = fallback or RuleEngineDecisionAI()
+        self.timeout = timeout
+        self.validate = validate
+        self.stats = {"primary": 0, "timeout": 0, "error": 0, "rejected": 0, "flagged": 0}
+        self.last_violations = ([], [])
+
+    @classmethod
+    def _pool(cls):
+        with cls._executor_guard:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="decision")
+            return cls._executor
+
+    def _use_fallback(self, inputs, key):
+        self.stats[key] += 1
+        return self.fallback.get_stock_decision(**inputs)
+
+    def get_stock_decision(self, **inputs):
+        try:
+            if self.timeout is None:
+                res = self.primary.get_stock_decision(**inputs)
+            else:
+                res = self._pool().submit(self.primary.get_stock_decision, **inputs).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            return self._use_fallback(inputs, "timeout")
+        except Exception as e:
+            print(f"⚠️ 의사결정 백엔드 오류, 규칙 엔진 사용: {e}")
+            return self._use_fallback(inputs, "error")
+
+        if not isinstance(res, dict):
+            # 검증을 끄더라도 시뮬레이터가 읽을 수 없는 응답은 쓰지 않는다
+            print(f"⚠️ dict 가 아닌 응답 대체: {type(res).__name__}")
+            return self._use_fallback(inputs, "rejected")
+
+        if self.validate:
+            rules = self.fallback if isinstance(self.fallback, RuleEngineDecisionAI) else None
+            errors, warnings = validate_decision(res, inputs, rules)
+            self.last_violations = (errors, warnings)
+            if errors:
+                print(f"⚠️ 규칙 위반 응답 대체: {'; '.join(errors)}")
+                return self._use_fallback(inputs, "rejected")
+            if warnings:
+                self.stats["flagged"] += 1
+                res = dict(res, warnings=warnings)
+
+        self.stats["primary"] += 1
+        return res
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def _round(value, decimals):
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return {k: _round(v, decimals) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_round(v, decimals) for v in value]
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if value != value:  # NaN
+        return None
+    return round(value, decimals)
+
+
+# 지표 스냅샷을 판단에 영향을 주는 구간으로 묶는다 (RSI 과매도/중립/과매수, MACD 히스토그램 부호, 볼린저 밴드 위치)
+# 새 분봉마다 조금씩 바뀌는 지표 값 대신 구간만 키에 넣어야 시세가 그대로인 다음 틱에서도 캐시가 맞는다.
+def indicator_zones(snapshot):
+    if not snapshot:
+        return None
+    rsi, hist, close = snapshot.get("rsi"), snapshot.get("macd_hist"), snapshot.get("close")
+    upper, lower = snapshot.get("bb_upper"), snapshot.get("bb_lower")
+    zones = {
+        "rsi": None if rsi is None else "low" if rsi < 30 else "high" if rsi > 70 else "mid",
+        "macd": None if hist is None else "up" if hist > 0 else "down" if hist < 0 else "flat",
+        "bb": None,
+    }
+    if None not in (close, upper, lower):
+        zones["bb"] = "above" if close > upper else "below" if close < lower else "inside"
+    return zones
+
+
+# 프롬프트 입력을 정규화한 뒤 해시한 값을 캐시 키로 사용
+# 시세(반올림한 현재가 / 이동 평균), 보유 수량 / 현금, 지표 구간만 반영해서 시세가 그대로면 틱이 바뀌어도 같은 키가 된다.
+# 매 분봉마다 달라지는 주가 이력 / 직전 판단 / 지표 원값은 넣지 않는다 (hist_points 를 주면 이력 마지막 N 개도 반영).
+def decision_key(inputs, price_decimals=2, indicator_decimals=1, hist_points=0):
+    normalized = {
+        "market": inputs.get("market"),
+        "company_name": inputs.get("company_name"),
+        "current_price": _round(inputs.get("current_price"), price_decimals),
+        "current_count": int(inputs.get("current_count") or 0),
+        "current_money": _round(inputs.get("current_money"), 2),
+        "avg_cost": _round(inputs.get("avg_cost"), price_decimals),
+    }
+    for name in ("ma_5m", "ma_20m", "ma_5d", "ma_20d"):
+        normalized[name] = _round(inputs.get(name), indicator_decimals)
+    if hist_points:
+        for name in ("price_hist_1y", "price_hist_10m"):
+            hist = inputs.get(name)
+            normalized[name] = _round(list(hist)[-hist_points:], price_decimals) if hist is not None else None
+    indicators = inputs.get("indicators") or {}
+    normalized["indicators"] = {label: indicator_zones(snap) for label, snap in indicators.items()}
+
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# 재시작 후에도 유지되는 SQLite 저장소
+class SQLiteDecisionStore:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, created REAL, decision TEXT)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT created, decision FROM decisions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, key, created, decision):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO decisions (key, created, decision) VALUES (?, ?, ?)",
+                (key, created, json.dumps(decision, ensure_ascii=False)),
+            )
+            self._conn.commit()
+
+    def prune(self, older_than):
+        with self._lock:
+            self._conn.execute("DELETE FROM decisions WHERE created < ?", (older_than,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# LLM 의사결정 캐시 (TTL + LRU, 선택적으로 디스크 저장)
+class DecisionCache:
+    def __init__(
+        self,
+        ttl=300,
+        max_size=1024,
+        price_decimals=2,
+        indicator_decimals=1,
+        hist_points=0,
+        path=None,
+        clock=time.time
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.price_decimals = price_decimals
+        self.indicator_decimals = indicator_decimals
+        self.hist_points = hist_points
+        self.clock = clock
+        self.store = SQLiteDecisionStore(path) if path else None
+        self._entries = OrderedDict()  # key -> (저장 시각, 결정)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0}
+
+    def key(self, inputs):
+        return decision_key(
+            inputs,
+            price_decimals=self.price_decimals,
+            indicator_decimals=self.indicator_decimals,
+            hist_points=self.hist_points,
+        )
+
+    def _fresh(self, created):
+        return self.clock() - created < self.ttl
+
+    def get(self, inputs):
+        key = self.key(inputs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return dict(entry[1])
+            if entry is not None:
+                del self._entries[key]
+
+        if self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                with self._lock:
+                    self._remember(key, entry)
+                    self.stats["hits"] += 1
+                    self.stats["disk_hits"] += 1
+                return dict(entry[1])
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, inputs, decision):
+        key = self.key(inputs)
+        entry = (self.clock(), dict(decision))
+        with self._lock:
+            self._remember(key, entry)
+        if self.store is not None:
+            self.store.put(key, entry[0], entry[1])
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.prune(float("inf"))
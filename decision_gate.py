@@ -0,0 +1,191 @@
+import collections
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+from decision_backends import RuleEngineDecisionAI
+from metrics import inc
+
+
+# 의미 있는 시장 변화가 있을 때만 LLM 을 호출하기 위한 트리거 판단
+# - 이동 평균 교차 (ma_5m/ma_20m, ma_5d/ma_20d)
+# - 분할 매수 단계 / 목표 수익률 / 저항선 기준 통과
+# - 변동성 급등 (직전 수익률이 최근 표준편차의 vol_mult 배 이상)
+# - 보유 수량 변화
+# - 마지막 호출 후 max_staleness 초 경과
+MA_PAIRS = (("ma_5m", "ma_20m"), ("ma_5d", "ma_20d"))
+
+
+class _TickerState:
+    def __init__(self, vol_window):
+        self.ma_signs = {}
+        self.zone = None
+        self.count = None
+        self.last_call = None
+        self.prices = collections.deque(maxlen=vol_window + 1)
+
+
+class DecisionGate:
+    def __init__(self, rules=None, ma_pairs=MA_PAIRS, vol_window=30, vol_mult=3.0, min_vol_samples=10,
+                 max_staleness=15 * 60):
+        self.rules = rules or RuleEngineDecisionAI()  # 매수 단계 / 목표 수익률 / 저항선 기준을 규칙 엔진과 공유
+        self.ma_pairs = ma_pairs
+        self.vol_window = vol_window
+        self.vol_mult = vol_mult
+        self.min_vol_samples = min_vol_samples
+        self.max_staleness = max_staleness
+        self._states = {}
+
+    # 현재가가 속한 구간: (도달한 매수 단계 수, 목표 수익률 도달, 저항선 도달)
+    def zone(self, inputs):
+        price = float(inputs["current_price"])
+        fair = inputs.get("fair_value") or inputs.get("ma_20d")
+        avg_cost = inputs.get("avg_cost")
+        ma_20d = inputs.get("ma_20d")
+        reached = sum(1 for level in self.rules.levels if fair and price <= fair * level)
+        take_profit = bool(avg_cost and inputs.get("current_count") and price >= avg_cost * self.rules.take_profit)
+        resist = bool(ma_20d and price >= ma_20d * self.rules.resist_mult)
+        return reached, take_profit, resist
+
+    # (호출 여부, 사유 목록). 호출하지 않을 때의 사유는 트리거별로 왜 조건이 아니었는지 기록한다.
+    def check(self, ticker, inputs, now):
+        state = self._states.get(ticker)
+        if state is None:
+            state = self._states[ticker] = _TickerState(self.vol_window)
+        triggers, quiet = [], []
+
+        if state.last_call is None:
+            triggers.append("첫 판단")
+
+        for fast, slow in self.ma_pairs:
+            a, b = inputs.get(fast), inputs.get(slow)
+            if a is None or b is None:
+                continue
+            sign = np.sign(a - b)
+            prev = state.ma_signs.get(fast)
+            if prev is not None and prev != 0 and sign != prev:
+                triggers.append(f"{fast}/{slow} {'골든' if sign > 0 else '데드'} 크로스")
+            else:
+                quiet.append(f"{fast}/{slow} 교차 없음")
+            state.ma_signs[fast] = sign
+
+        zone = self.zone(inputs)
+        if state.zone is not None and zone != state.zone:
+            triggers.append(f"가격 기준 구간 변경 {state.zone} → {zone}")
+        else:
+            quiet.append(f"가격 구간 유지 {zone}")
+        state.zone = zone
+
+        price = float(inputs["current_price"])
+        state.prices.append(price)
+        if len(state.prices) > self.min_vol_samples:
+            returns = np.diff(np.log(np.fromiter(state.prices, dtype=float)))
+            sigma = returns[:-1].std()
+            ratio = abs(returns[-1]) / sigma if sigma > 0 else 0.0
+            if ratio >= self.vol_mult:
+                triggers.append(f"변동성 급등 ({ratio:.1f}σ)")
+            else:
+                quiet.append(f"변동 {ratio:.1f}σ < {self.vol_mult}σ")
+
+        count = inputs.get("current_count")
+        if state.count is not None and count != state.count:
+            triggers.append(f"보유 수량 변화 {state.count} → {count}")
+        state.count = count
+
+        if state.last_call is not None:
+            age = now - state.last_call
+            if age >= self.max_staleness:
+                triggers.append(f"마지막 판단 후 {age:.0f}초 경과")
+            else:
+                quiet.append(f"마지막 판단 {age:.0f}초 전")
+
+        if triggers:
+            state.last_call = now
+            return True, triggers
+        return False, quiet
+
+    def reset(self, ticker=None):
+        if ticker is None:
+            self._states.clear()
+        else:
+            self._states.pop(ticker, None)
+
+
+# 트리거가 있을 때만 내부 백엔드를 호출하고, 그 사이에는 마지막 판단을 재사용하는 래퍼
+# 매수/매도 판단은 이미 한 번 처리되었으므로 재사용할 때는 같은 사유의 홀드로 돌려준다.
+# 모든 판단(호출 / 생략)과 사유를 기록해서 게이트 유무에 따른 결과를 다시 비교할 수 있다.
+class GatedDecisionAI:
+    def __init__(self, inner, gate=None, log_path=None, log_size=1000, clock=time.monotonic):
+        self.inner = inner
+        self.gate = gate or DecisionGate()
+        self.log_path = log_path  # JSONL 로 남길 경로 (없으면 메모리에만 최근 log_size 건)
+        self.log = collections.deque(maxlen=log_size)
+        self.clock = clock
+        self.stats = {"calls": 0, "suppressed": 0}
+        self._last = {}
+        self._now = None
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()  # 파일 쓰기는 게이트 잠금 밖에서 (다른 종목 판단을 막지 않도록)
+
+    # 백테스트: 봉 시각을 시계로 사용 (내부 소스에도 전달)
+    def set_time(self, now):
+        self._now = pd.Timestamp(now)
+        set_time = getattr(self.inner, "set_time", None)
+        if set_time is not None:
+            set_time(now)
+
+    def _time(self):
+        return self._now.timestamp() if self._now is not None else self.clock()
+
+    def get_stock_decision(self, **inputs):
+        ticker = inputs.get("company_name")
+        with self._lock:
+            should_call, reasons = self.gate.check(ticker, inputs, self._time())
+            last = self._last.get(ticker)
+
+        if should_call or last is None:
+            res = self.inner.get_stock_decision(**inputs)
+            with self._lock:
+                self._last[ticker] = res
+                self.stats["calls"] += 1
+            inc("gate_calls_total")
+        else:
+            res = last
+            if last.get("action") != "hold":
+                res = dict(last, action="hold", quantity=0, reason=f"새 신호 없음, 이전 판단 유지: {last.get('reason', '')}")
+            res = dict(res, price=inputs["current_price"])
+            with self._lock:
+                self.stats["suppressed"] += 1
+            inc("gate_suppressed_total")
+
+        self._record(ticker, should_call, reasons, inputs, res)
+        return res
+
+    def _record(self, ticker, called, reasons, inputs, res):
+        entry = {
+            "time": self._now.isoformat() if self._now is not None else time.time(),
+            "ticker": ticker,
+            "called": called,
+            "reasons": reasons,
+            "price": float(inputs["current_price"]),
+            "count": inputs.get("current_count"),
+            "ma": {k: inputs.get(k) for k in ("ma_5m", "ma_20m", "ma_5d", "ma_20d")},
+            "decision": {k: res.get(k) for k in ("action", "quantity", "price")},
+        }
+        with self._lock:
+            self.log.append(entry)
+        if self.log_path:
+            line = json.dumps(entry, ensure_ascii=False, default=float) + "\n"
+            with self._file_lock:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+
+    # 최근 기록 (최신순)
+    def recent(self, limit=50):
+        with self._lock:
+            return list(self.log)[-limit:][::-1]
+
+    def call_rate(self):
+        total = self.stats["calls"] + self.stats["suppressed"]
+        return self.stats["calls"] / total if total else 0.0
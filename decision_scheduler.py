@@ -0,0 +1,98 @@
+import datetime
+import threading
+from metrics import span, inc
+from market_calendar import TickScheduler
+
+
+# 화면 렌더링과 무관하게 정해진 주기로 종목별 판단을 실행하는 스케줄러
+# 프로세스당 하나만 두고, 같은 종목은 접속한 세션 수와 상관없이 한 번만 계산한다.
+# 페이지는 latest() 로 마지막 계산 결과만 읽어서 그린다.
+class DecisionScheduler:
+    def __init__(self, simulator_factory, interval=60, active=None, max_tickers=20, offset=2.0, calendar=None,
+                 sessions=("regular",), policy="skip", restart_delay=60):
+        self.simulator_factory = simulator_factory  # ticker -> StockSimulator
+        self.interval = interval
+        self.active = active or (lambda: True)      # False 이면 이번 주기는 건너뜀
+        self.max_tickers = max_tickers
+        self.restart_delay = restart_delay
+        # 거래소 달력 기준으로 봉 마감 + offset 에 실행 (장 마감 / 휴일에는 다음 세션까지 대기)
+        self.tick_options = dict(interval=interval, offset=offset, calendar=calendar, sessions=sessions, policy=policy)
+        self._states = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # 종목을 등록하고 작업 스레드가 없으면 시작. 등록 한도를 넘으면 False.
+    # 작업 스레드가 오류로 끝난 종목은 restart_delay 초가 지난 뒤 다시 요청되면 새로 시작한다.
+    def ensure(self, ticker):
+        with self._lock:
+            if ticker in self._threads:
+                return True
+            state = self._states.get(ticker)
+            if state and state.get("fatal"):
+                age = (datetime.datetime.now(datetime.timezone.utc) - state["updated_at"]).total_seconds()
+                if age < self.restart_delay:
+                    return True
+            if len(self._threads) >= self.max_tickers:
+                return False
+            thread = threading.Thread(target=self._loop, args=(ticker,), name=f"decision-{ticker}", daemon=True)
+            self._threads[ticker] = thread
+        thread.start()
+        return True
+
+    def latest(self, ticker):
+        with self._lock:
+            return self._states.get(ticker)
+
+    def tickers(self):
+        with self._lock:
+            return list(self._threads)
+
+    def stop(self):
+        self._stop.set()
+
+    # 시뮬레이터 생성 / 첫 틱 / 스케줄러에서 난 오류로 스레드가 조용히 끝나지 않도록 상태에 남긴다 (화면에 표시)
+    def _loop(self, ticker):
+        try:
+            self._run(ticker)
+        except Exception as e:
+            inc("tick_errors_total")
+            print(f"⚠️ {ticker} 판단 스레드 종료: {type(e).__name__} - {e}")
+            self._update(ticker, error=f"{type(e).__name__}: {e}", fatal=True)
+            with self._lock:
+                self._threads.pop(ticker, None)
+
+    def _run(self, ticker):
+        sim = self.simulator_factory(ticker)
+        scheduler = TickScheduler(**self.tick_options)
+
+        def tick():
+            if self.active():
+                self.run_once(ticker, sim)
+
+        # 장 중에 등록되면 다음 봉 마감을 기다리지 않고 한 번 계산해서 화면을 바로 채운다
+        if scheduler.calendar.is_open(sessions=scheduler.sessions):
+            tick()
+        scheduler.run(tick, self._stop)
+
+    def run_once(self, ticker, sim):
+        try:
+            with span("decision_stage_seconds", stage="tick"):
+                df = sim.collect()
+                if df.empty:
+                    self._update(ticker, error="No data available")
+                    return
+                price = df['Close'].iloc[-1]
+                res = sim.decide(df)
+                result = sim.handle_decision(res, price)
+            self._update(ticker, candles=df, price=price, result=result, error=None, fatal=False)
+        except Exception as e:
+            inc("tick_errors_total")
+            self._update(ticker, error=str(e))
+
+    def _update(self, ticker, **fields):
+        with self._lock:
+            state = dict(self._states.get(ticker) or {})
+            state.update(fields)
+            state["updated_at"] = datetime.datetime.now(datetime.timezone.utc)
+            self._states[ticker] = state
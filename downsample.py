@@ -0,0 +1,99 @@
+import math
+import numpy as np
+import pandas as pd
+
+
+# 브라우저로 보내는 차트 점 개수를 차트 폭에 맞춰 제한한다
+DEFAULT_CHART_WIDTH = 1200  # px
+PX_PER_CANDLE = 4           # 캔들 하나가 차지하는 최소 폭
+PX_PER_POINT = 1            # 선 차트는 픽셀당 한 점
+
+
+def max_candles(width=DEFAULT_CHART_WIDTH):
+    return max(int(width // PX_PER_CANDLE), 10)
+
+
+def max_points(width=DEFAULT_CHART_WIDTH):
+    return max(int(width // PX_PER_POINT), 10)
+
+
+# n 개의 행을 limit 개 이하의 연속 구간으로 나눈 (시작 행, 끝 행)
+def bucket_bounds(n, limit):
+    bucket = max(math.ceil(n / limit), 1)
+    starts = np.arange(0, n, bucket)
+    ends = np.r_[starts[1:], n] - 1
+    return starts, ends
+
+
+# 연속된 봉을 구간별로 묶어 OHLC 를 보존한 채 집계 (시가=첫 값, 고가=최대, 저가=최소, 종가=마지막)
+def ohlc_downsample(df, limit, time_col="Date"):
+    n = len(df)
+    if n <= limit:
+        return df
+    starts, ends = bucket_bounds(n, limit)
+
+    out = {time_col: df[time_col].iloc[starts].reset_index(drop=True)}
+    if "Open" in df:
+        out["Open"] = df["Open"].to_numpy()[starts]
+    if "High" in df:
+        out["High"] = np.maximum.reduceat(df["High"].to_numpy(dtype=float), starts)
+    if "Low" in df:
+        out["Low"] = np.minimum.reduceat(df["Low"].to_numpy(dtype=float), starts)
+    if "Close" in df:
+        out["Close"] = df["Close"].to_numpy()[ends]
+    if "Volume" in df:
+        out["Volume"] = np.add.reduceat(df["Volume"].to_numpy(dtype=float), starts)
+    return pd.DataFrame(out)
+
+
+# Largest-Triangle-Three-Buckets: 선 모양을 최대한 유지하면서 limit 개의 점만 고른다. 선택된 행 번호를 반환.
+def lttb_indices(y, limit):
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if limit >= n or limit < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float)
+
+    edges = np.linspace(1, n - 1, limit - 1).astype(int)  # 첫/마지막 점을 제외한 구간 경계
+    selected = np.empty(limit, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(limit - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # 다음 구간의 평균 점
+        nlo, nhi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        nhi = max(nhi, nlo + 1)
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        # 삼각형 넓이가 가장 큰 점 선택
+        area = np.abs((x[prev] - avg_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (avg_y - y[prev]))
+        prev = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        selected[i + 1] = prev
+    return selected
+
+
+def lttb(df, limit, value_col="Close"):
+    if len(df) <= limit:
+        return df
+    return df.iloc[lttb_indices(df[value_col].to_numpy(), limit)]
+
+
+# yfinance 분봉이 지금부터 거슬러 제공되는 기간
+INTRADAY_LOOKBACK = {"1m": pd.Timedelta(days=29), "5m": pd.Timedelta(days=59), "60m": pd.Timedelta(days=729)}
+
+
+# 확대 구간 길이에 맞는 가장 세밀한 yfinance 간격 (yfinance 가 제공하는 기간 제한 고려)
+# age: 구간 시작이 지금으로부터 얼마나 지났는지. 주면 그만큼 거슬러 받을 수 없는 간격은 건너뛴다.
+def finer_interval(span, age=None):
+    for interval, max_span in (("1m", pd.Timedelta(days=5)), ("5m", pd.Timedelta(days=55)), ("60m", pd.Timedelta(days=700))):
+        if span <= max_span and (age is None or age <= INTRADAY_LOOKBACK[interval]):
+            return interval
+    return "1d"
+
+
+INTERVAL_ORDER = ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo"]
+
+
+def is_finer(a, b):
+    return INTERVAL_ORDER.index(a) < INTERVAL_ORDER.index(b)
@@ -1,27 +1,84 @@
-import google.generativeai as genai
-from datetime import datetime
+import threading
 from typing import Optional
 from dotenv import load_dotenv
 import os
-import json
-from stock_data_fetcher import fetch_stock_data
+from metrics import inc
+from response_parsing import parse_decision, parse_repaired, repair_messages, DecisionParseError, GEMINI_RESPONSE_SCHEMA
 
 # 환경 변수 로드
 load_dotenv()
 
 # 상수 설정
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL_NAME = "gemini-1.5-flash"
 
-# API 키 유효성 검사
-if not GEMINI_API_KEY:
-    raise EnvironmentError("환경 변수 'GEMINI_API_KEY'가 설정되지 않았습니다.")
-
-# Gemini 구성
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel(model_name=GEMINI_MODEL_NAME)
-
-
+# Gemini 모델은 처음 사용할 때 한 번만 만들고 재사용한다 (import 시점에는 네트워크/키 확인 없음)
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise EnvironmentError("환경 변수 'GEMINI_API_KEY'가 설정되지 않았습니다.")
+                import google.generativeai as genai
+
+                genai.configure(api_key=api_key)
+                _model = genai.GenerativeModel(
+                    model_name=GEMINI_MODEL_NAME,
+                    generation_config={
+                        "response_mime_type": "application/json",
+                        "response_schema": GEMINI_RESPONSE_SCHEMA  # 스키마에 맞는 JSON 만 생성
+                    }
+                )
+    return _model
+
+
+# OpenAI 경로와 같은 입력(get_stock_decision 인자)으로 규칙/요청/질문/출력 형식을 하나의 프롬프트로 합친다
+def build_gemini_request(
+    market: str,
+    company_name: str,
+    current_count: int,
+    current_money: float,
+    current_price: float,
+    ma_5m: Optional[float],
+    ma_20m: Optional[float],
+    ma_5d: Optional[float],
+    ma_20d: Optional[float],
+    price_hist_1y,
+    price_hist_10m,
+    prev_res: str = "",
+    indicators: Optional[dict] = None,
+    avg_cost: Optional[float] = None,
+    token_budget: Optional[int] = None
+) -> str:
+    from prompts import build_messages, DEFAULT_TOKEN_BUDGET
+
+    inputs = {
+        "market": market,
+        "company_name": company_name,
+        "price_hist_1y": price_hist_1y,
+        "price_hist_10m": price_hist_10m,
+        "current_price": current_price,
+        "current_count": current_count,
+        "current_money": current_money,
+        "ma_5m": ma_5m,
+        "ma_20m": ma_20m,
+        "ma_5d": ma_5d,
+        "ma_20d": ma_20d,
+        "prev_res": prev_res,
+        "indicators": indicators,
+        "avg_cost": avg_cost,
+    }
+    messages, _ = build_messages(inputs, token_budget=token_budget or DEFAULT_TOKEN_BUDGET)
+    return "\n\n".join(m["content"] for m in messages)
+
+
+# 이전 호출 방식 호환용: 프롬프트를 만들어 한 번 보내고 응답 문자열을 그대로 돌려준다 (실패 시 "[오류] ..." 문자열)
+# 새 코드는 build_gemini_request 와 GeminiDecisionAI 를 쓴다.
 def build_gemini_prompt(
     market: str,
     company_name: str,
@@ -33,112 +90,128 @@ def build_gemini_prompt(
     ma_20m: Optional[float],
     ma_5d: Optional[float],
     ma_20d: Optional[float],
-    price_hist_1y: str,
-    price_hist_10m: str,
+    price_hist_1y,
+    price_hist_10m,
     prev_res: str = ""
 ) -> str:
-    def make_ma_summary() -> str:
-        summaries = [
-            f"5분 이동 평균: {ma_5m}달러" if ma_5m is not None else None,
-            f"20분 이동 평균: {ma_20m}달러" if ma_20m is not None else None,
-            f"최근 5일 이동 평균: {ma_5d}달러" if ma_5d is not None else None,
-            f"최근 20일 이동 평균: {ma_20d}달러" if ma_20d is not None else None,
-        ]
-        return "\n".join(filter(None, summaries))
-
-    chat = model.start_chat()
-
-    rule_message = "# 규칙\n당신은 AI 주식 트레이너입니다."
-
-    request_message = f"""# 요청
-{market}의 {company_name} 종목에 대해 이야기할 거야.
-현재 {company_name}의 주가는 1주당 {current_price}달러이고,
-나는 {current_count}주를 보유 중이며, 보유 현금은 {current_money}달러야.
-
-## 이동 평균
-{make_ma_summary()}
-
-## 이전 주가 정보
-최근 1년간 일별 변동:
-{price_hist_1y}
-
-최근 10분간 분별 변동:
-{price_hist_10m}
-
-참고로 너는 10분 전에 "{prev_res}"라고 판단했어.
-"""
-
-    question_message = """# 질문
-지금은 어떤 타이밍이니? 매수/매도/보유 중에서 선택해줘.
-몇 주를 어떤 가격에 거래할지도 구체적으로 말해줘.
-최종 판단은 인간이 해, 너는 조언만 해주는 역할이야."""
-
-    output_format_message = """# 출력 형식
-출력은 Python에서 사용 가능한 JSON 형식으로 해줘.
-JSON을 마크다운이나 텍스트로 감싸지 말고, 순수하게 객체만 출력해.
-
-형식 예시는 다음과 같아:
-{
-  "reason": "...이유 설명...",
-  "risk_type": "안정적" or "공격적",
-  "action": "buy" or "sell" or "hold",
-  "quantity": 정수,  # 주식 수
-  "price": 실수      # 거래 가격
-}
-
-`reason`을 우선 생각한 후, 단계적으로 분석해줘.
-"""
-
+    # 이전처럼 문자열 / 리스트 이력도 받는다 (숫자 목록 문자열은 배열로, 그 외 문자열은 텍스트 그대로)
     try:
-        messages = [
-            rule_message,
-            request_message,
-            question_message,
-            output_format_message,
-        ]
-
-        for idx, msg in enumerate(messages, start=1):
-            chat.send_message(msg)
-
-        # Gemini 응답을 받아서 리턴
-        return chat.last.text
-
+        prompt = build_gemini_request(
+            market=market,
+            company_name=company_name,
+            current_count=current_count,
+            current_money=current_money,
+            current_price=current_price,
+            ma_5m=ma_5m,
+            ma_20m=ma_20m,
+            ma_5d=ma_5d,
+            ma_20d=ma_20d,
+            price_hist_1y=price_hist_1y,
+            price_hist_10m=price_hist_10m,
+            prev_res=prev_res
+        )
+        return get_model().generate_content(prompt).text
     except Exception as e:
-        return f"[오류] Gemini 응답 중 {idx}번째 메시지 전송 실패: {e}"
+        return f"[오류] Gemini 응답 요청 실패: {e}"
+
+
+def parse_gemini_response(text: str) -> dict:
+    return parse_decision(text)
+
+
+# 파싱 실패 시 판단을 다시 하지 않고 형식만 고치는 짧은 요청 한 번
+def repair_gemini_response(model, text: str, error: Exception) -> dict:
+    inc("decision_repair_requests_total")
+    prompt = "\n\n".join(m["content"] for m in repair_messages(text, error))
+    return parse_repaired(model.generate_content(prompt).text)
+
+
+class GeminiDecisionAI:
+    def __init__(self, token_budget: Optional[int] = None):
+        self.token_budget = token_budget
+
+    # StockDecisionAI.get_stock_decision 과 같은 인자를 받는다 (요청은 한 번만 전송)
+    def get_stock_decision(
+        self,
+        market,
+        company_name,
+        price_hist_1y,
+        price_hist_10m,
+        current_price,
+        current_count,
+        current_money,
+        ma_5m,
+        ma_20m,
+        ma_5d,
+        ma_20d,
+        prev_res,
+        max_retries=2,
+        indicators=None,
+        avg_cost=None
+    ) -> dict:
+        prompt = build_gemini_request(
+            market=market,
+            company_name=company_name,
+            current_count=current_count,
+            current_money=current_money,
+            current_price=current_price,
+            ma_5m=ma_5m,
+            ma_20m=ma_20m,
+            ma_5d=ma_5d,
+            ma_20d=ma_20d,
+            price_hist_1y=price_hist_1y,
+            price_hist_10m=price_hist_10m,
+            prev_res=prev_res,
+            indicators=indicators,
+            avg_cost=avg_cost,
+            token_budget=self.token_budget
+        )
+
+        model = get_model()
+        for attempt in range(max_retries):
+            try:
+                text = model.generate_content(prompt).text
+                try:
+                    return parse_gemini_response(text)
+                except DecisionParseError as e:
+                    return repair_gemini_response(model, text, e)
+            except DecisionParseError as e:
+                print(f"[{attempt+1}/{max_retries}] Gemini 응답을 파싱할 수 없습니다: {e}")
+            except Exception as e:
+                print(f"[{attempt+1}/{max_retries}] Gemini 응답 오류: {e}")
+
+        return {
+            "reason": "Gemini 응답 실패 또는 형식 오류. 기본값으로 처리함.",
+            "risk_type": "안정적",
+            "action": "hold",
+            "quantity": 0,
+            "price": current_price
+        }
 
 
 def get_gemini_decision(market, company_name, ticker_symbol, current_count, current_money, prev_res=""):
+    try:
+        from stock_data_fetcher import fetch_stock_data
+    except ImportError as e:
+        raise ImportError(
+            "get_gemini_decision 은 'stock_data_fetcher' 모듈(fetch_stock_data 함수)이 필요합니다. "
+            "모듈을 추가하거나, 직접 수집한 데이터로 GeminiDecisionAI().get_stock_decision 을 호출하세요."
+        ) from e
+
     # 데이터 수집
     data = fetch_stock_data(ticker_symbol)
 
-    # Debugging: Print data to verify
-    print("Stock Data:", data)
-
-    # Gemini 응답 받기
-    response = build_gemini_prompt(
+    return GeminiDecisionAI().get_stock_decision(
         market=market,
         company_name=company_name,
-        ticker_symbol=ticker_symbol,
+        price_hist_1y=data["price_hist_1y"],
+        price_hist_10m=data["price_hist_10m"],
+        current_price=data["current_price"],
         current_count=current_count,
         current_money=current_money,
-        current_price=data["current_price"],
         ma_5m=data["ma_5m"],
         ma_20m=data["ma_20m"],
         ma_5d=data["ma_5d"],
         ma_20d=data["ma_20d"],
-        price_hist_1y=data["price_hist_1y"],
-        price_hist_10m=data["price_hist_10m"],
         prev_res=prev_res
     )
-
-    # Debugging: Print the response
-    print("Gemini Response:", response)
-
-    # JSON 파싱
-    try:
-        decision = json.loads(response)
-        return decision
-    except json.JSONDecodeError:
-        print("Gemini 응답을 파싱할 수 없습니다.")
-        print(response)  # To see the full response if it's not valid JSON
-        return None
\ No newline at end of file
@@ -0,0 +1,299 @@
+from collections import deque
+import math
+import numpy as np
+import pandas as pd
+
+
+# 봉 하나가 들어올 때마다 상수 시간에 갱신되는 기술 지표들
+# push(x): 새 봉 추가 / amend(x): 진행 중인 마지막 봉의 값 교체
+
+class SMA:
+    # 누적합 오차를 막기 위해 일정 횟수마다 합계를 다시 계산
+    # 분산 계산의 자릿수 손실을 줄이기 위해 첫 값을 기준으로 이동한 값을 보관한다
+    RESYNC_EVERY = 1000
+
+    def __init__(self, window):
+        self.window = window
+        self._values = deque()
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._since_resync = 0
+        self._shift = None
+
+    def push(self, x):
+        if self._shift is None:
+            self._shift = x
+        x -= self._shift
+        self._values.append(x)
+        self._sum += x
+        self._sumsq += x * x
+        if len(self._values) > self.window:
+            old = self._values.popleft()
+            self._sum -= old
+            self._sumsq -= old * old
+        self._since_resync += 1
+        if self._since_resync >= self.RESYNC_EVERY:
+            self._sum = sum(self._values)
+            self._sumsq = sum(v * v for v in self._values)
+            self._since_resync = 0
+
+    def amend(self, x):
+        if not self._values:
+            return self.push(x)
+        x -= self._shift
+        old = self._values[-1]
+        self._values[-1] = x
+        self._sum += x - old
+        self._sumsq += x * x - old * old
+
+    @property
+    def ready(self):
+        return len(self._values) >= self.window
+
+    @property
+    def value(self):
+        return self._shift + self._sum / self.window if self.ready else None
+
+    # 모표준편차 (ddof=0)
+    @property
+    def std(self):
+        if not self.ready:
+            return None
+        mean = self._sum / self.window
+        return math.sqrt(max(self._sumsq / self.window - mean * mean, 0.0))
+
+
+class EMA:
+    def __init__(self, span=None, alpha=None, min_periods=1):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1)
+        self.min_periods = min_periods
+        self._value = None
+        self._prev = None
+        self.count = 0
+
+    def _step(self, prev, x):
+        return x if prev is None else prev + self.alpha * (x - prev)
+
+    def push(self, x):
+        self._prev = self._value
+        self._value = self._step(self._prev, x)
+        self.count += 1
+
+    def amend(self, x):
+        if self.count == 0:
+            return self.push(x)
+        self._value = self._step(self._prev, x)
+
+    @property
+    def value(self):
+        return self._value if self.count >= self.min_periods else None
+
+
+class MACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def push(self, x):
+        self.fast.push(x)
+        self.slow.push(x)
+        self.signal.push(self.fast.value - self.slow.value)
+
+    def amend(self, x):
+        self.fast.amend(x)
+        self.slow.amend(x)
+        self.signal.amend(self.fast.value - self.slow.value)
+
+    @property
+    def value(self):
+        if self.fast.value is None:
+            return None
+        return self.fast.value - self.slow.value
+
+
+# Wilder 방식 RSI (alpha = 1/period)
+class RSI:
+    def __init__(self, period=14):
+        self.period = period
+        self.gain = EMA(alpha=1.0 / period, min_periods=period)
+        self.loss = EMA(alpha=1.0 / period, min_periods=period)
+        self._last = None
+        self._prev_last = None
+
+    def push(self, x):
+        self._prev_last = self._last
+        if self._last is not None:
+            delta = x - self._last
+            self.gain.push(max(delta, 0.0))
+            self.loss.push(max(-delta, 0.0))
+        self._last = x
+
+    def amend(self, x):
+        if self._prev_last is None:
+            self._last = x
+            return
+        delta = x - self._prev_last
+        self.gain.amend(max(delta, 0.0))
+        self.loss.amend(max(-delta, 0.0))
+        self._last = x
+
+    @property
+    def value(self):
+        gain, loss = self.gain.value, self.loss.value
+        if gain is None:
+            return None
+        if loss == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + gain / loss)
+
+
+class BollingerBands:
+    def __init__(self, window=20, k=2.0):
+        self.k = k
+        self.sma = SMA(window)
+
+    def push(self, x):
+        self.sma.push(x)
+
+    def amend(self, x):
+        self.sma.amend(x)
+
+    @property
+    def value(self):
+        mid = self.sma.value
+        if mid is None:
+            return None
+        band = self.k * self.sma.std
+        return mid + band, mid, mid - band
+
+
+# rule_message 에서 요구하는 지표들을 한 번에 관리
+class IndicatorEngine:
+    def __init__(self, sma_windows=(5, 20, 60), ema_span=20, macd=(12, 26, 9), rsi_period=14, bb_window=20, bb_k=2.0):
+        self.sma_windows = tuple(sma_windows)
+        self.ema_span = ema_span
+        self.macd_params = tuple(macd)
+        self.rsi_period = rsi_period
+        self.bb_window = bb_window
+        self.bb_k = bb_k
+        self.reset()
+
+    def reset(self):
+        self.smas = {w: SMA(w) for w in self.sma_windows}
+        self.ema = EMA(self.ema_span)
+        self.macd = MACD(*self.macd_params)
+        self.rsi = RSI(self.rsi_period)
+        self.bb = BollingerBands(self.bb_window, self.bb_k)
+        self.last_time = None
+        self.last_close = None
+        self.count = 0
+
+    def _parts(self):
+        return (*self.smas.values(), self.ema, self.macd, self.rsi, self.bb)
+
+    def update(self, close, new_bar=True, time=None):
+        close = float(close)
+        if new_bar or self.count == 0:
+            for part in self._parts():
+                part.push(close)
+            self.count += 1
+        else:
+            for part in self._parts():
+                part.amend(close)
+        self.last_close = close
+        if time is not None:
+            self.last_time = time
+
+    # 전체 시계열을 받아서 새로 생긴 봉만 반영
+    # 마지막으로 본 시각의 봉은 값만 교체하고, 그 이후 봉만 추가한다.
+    # 마지막 시각이 시계열에 없으면 (티커 변경, 거래일 변경 등) 처음부터 다시 채운다.
+    def sync(self, times, closes):
+        times = np.asarray(times)
+        closes = np.asarray(closes, dtype=float)
+        if len(times) == 0:
+            return self
+
+        start = 0
+        if self.last_time is not None:
+            pos = int(np.searchsorted(times, self.last_time))
+            if pos < len(times) and times[pos] == self.last_time:
+                self.update(closes[pos], new_bar=False)
+                start = pos + 1
+            else:
+                self.reset()
+        for i in range(start, len(closes)):
+            self.update(closes[i])
+        self.last_time = times[-1]
+        return self
+
+    def value(self, name):
+        return self.snapshot().get(name)
+
+    def snapshot(self):
+        snap = {f"sma_{w}": sma.value for w, sma in self.smas.items()}
+        snap[f"ema_{self.ema_span}"] = self.ema.value
+        snap["macd"] = self.macd.value
+        snap["macd_signal"] = self.macd.signal.value
+        snap["macd_hist"] = (
+            snap["macd"] - snap["macd_signal"]
+            if snap["macd"] is not None and snap["macd_signal"] is not None else None
+        )
+        snap["rsi"] = self.rsi.value
+        bands = self.bb.value
+        snap["bb_upper"], snap["bb_middle"], snap["bb_lower"] = bands if bands else (None, None, None)
+        snap["close"] = self.last_close
+        return snap
+
+
+# 차트용: 전체 시계열을 한 번에 벡터 연산으로 계산 (IndicatorEngine 과 같은 정의)
+def compute_series(close, sma_windows=(5, 20, 60), ema_span=20, macd=(12, 26, 9), rsi_period=14, bb_window=20, bb_k=2.0):
+    close = pd.Series(close, dtype=float)
+    out = pd.DataFrame(index=close.index)
+    for w in sma_windows:
+        out[f"sma_{w}"] = close.rolling(window=w).mean()
+    out[f"ema_{ema_span}"] = close.ewm(span=ema_span, adjust=False).mean()
+
+    fast, slow, signal = macd
+    macd_line = close.ewm(span=fast, adjust=False).mean() - close.ewm(span=slow, adjust=False).mean()
+    out["macd"] = macd_line
+    out["macd_signal"] = macd_line.ewm(span=signal, adjust=False).mean()
+    out["macd_hist"] = out["macd"] - out["macd_signal"]
+
+    delta = close.diff()
+    gain = delta.clip(lower=0).ewm(alpha=1.0 / rsi_period, adjust=False, min_periods=rsi_period).mean()
+    loss = (-delta).clip(lower=0).ewm(alpha=1.0 / rsi_period, adjust=False, min_periods=rsi_period).mean()
+    rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+    out["rsi"] = rsi.where(loss != 0, 100.0).where(gain.notna())
+
+    mid = close.rolling(window=bb_window).mean()
+    std = close.rolling(window=bb_window).std(ddof=0)
+    out["bb_upper"] = mid + bb_k * std
+    out["bb_middle"] = mid
+    out["bb_lower"] = mid - bb_k * std
+    return out
+
+
+INDICATOR_LABELS = {
+    "sma_5": "5봉 이동 평균",
+    "sma_20": "20봉 이동 평균",
+    "sma_60": "60봉 이동 평균",
+    "ema_20": "20봉 지수 이동 평균",
+    "macd": "MACD",
+    "macd_signal": "MACD 시그널",
+    "macd_hist": "MACD 히스토그램",
+    "rsi": "RSI(14)",
+    "bb_upper": "볼린저 밴드 상단",
+    "bb_middle": "볼린저 밴드 중심",
+    "bb_lower": "볼린저 밴드 하단",
+}
+
+
+# 프롬프트에 넣을 지표 요약 (값이 없는 지표는 생략)
+def describe(snapshot, label=""):
+    lines = []
+    for key, name in INDICATOR_LABELS.items():
+        value = snapshot.get(key)
+        if value is not None:
+            lines.append(f"{label} {name}: {value:.4f}".strip())
+    return "\n".join(lines)
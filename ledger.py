@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+# (계좌, 종목) 하나의 보유 상태. 체결 하나를 O(1) 로 반영한다.
+class Position:
+    def __init__(self, count=0, avg_cost=0.0, realized=0.0, cash_flow=0.0, prev_res=None):
+        self.count = count
+        self.avg_cost = avg_cost    # 이동 평균 매입가
+        self.realized = realized    # 실현 손익
+        self.cash_flow = cash_flow  # 매수 -, 매도 + 누적 현금 흐름
+        self.prev_res = prev_res    # 마지막 판단 결과 문자열
+
+    def apply(self, side, quantity, price):
+        if side == "buy":
+            total = self.count + quantity
+            if total > 0:
+                self.avg_cost = (self.avg_cost * self.count + price * quantity) / total
+            self.count = total
+            self.cash_flow -= price * quantity
+        elif side == "sell":
+            self.realized += (price - self.avg_cost) * quantity
+            self.count -= quantity
+            self.cash_flow += price * quantity
+            if self.count == 0:
+                self.avg_cost = 0.0
+        else:
+            raise ValueError(f"알 수 없는 체결 구분: {side}")
+
+    def unrealized(self, price):
+        return (price - self.avg_cost) * self.count
+
+    def row(self):
+        return self.count, self.avg_cost, self.realized, self.cash_flow, self.prev_res
+
+
+# 원장 기본 위치: TRADE_LEDGER_PATH, 없으면 사용자 홈 아래 (실행한 작업 디렉터리에 DB 파일을 만들지 않는다)
+def default_path():
+    return os.getenv("TRADE_LEDGER_PATH") or os.path.join(os.path.expanduser("~"), ".as_project", "ledger.db")
+
+
+# 체결 원장 (SQLite WAL)
+# - 체결은 메모리의 Position 에 바로 반영하고, 디스크에는 모아서 한 트랜잭션으로 기록
+# - 같은 트랜잭션에서 positions 스냅샷도 갱신하므로 재시작 시 체결 전체를 다시 읽지 않는다
+# - 실시간 시뮬레이터는 batch_size=1 (체결마다 기록), 백테스트는 크게 잡아서 수백만 건도 빠르게 쌓는다
+class TradeLedger:
+    def __init__(self, path=None, batch_size=1, flush_interval=5.0):
+        path = path or default_path()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # 이 시간(초)이 지나면 batch_size 와 무관하게 기록
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS accounts (account TEXT PRIMARY KEY, initial_money REAL);
+            CREATE TABLE IF NOT EXISTS positions (
+                account TEXT, ticker TEXT, count INTEGER, avg_cost REAL, realized REAL, cash_flow REAL, prev_res TEXT,
+                PRIMARY KEY (account, ticker)
+            );
+            CREATE TABLE IF NOT EXISTS fills (
+                seq INTEGER PRIMARY KEY, ts REAL, account TEXT, ticker TEXT, side TEXT, quantity INTEGER, price REAL
+            );
+            CREATE INDEX IF NOT EXISTS fills_account ON fills (account, ticker);
+        """)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._accounts = {}   # account -> 초기 자금
+        self._positions = {}  # (account, ticker) -> Position
+        self._pending = []    # 아직 기록하지 않은 체결
+        self._dirty = set()   # 스냅샷을 다시 써야 하는 (account, ticker)
+        self._last_flush = time.monotonic()
+        self._replay()
+
+    # 시작 시 스냅샷을 읽어서 메모리 상태 복구
+    def _replay(self):
+        with self._lock:
+            for account, initial_money in self._conn.execute("SELECT account, initial_money FROM accounts"):
+                self._accounts[account] = initial_money
+            for account, ticker, *row in self._conn.execute(
+                "SELECT account, ticker, count, avg_cost, realized, cash_flow, prev_res FROM positions"
+            ):
+                self._positions[(account, ticker)] = Position(*row)
+
+    # 계좌/종목 등록 (이미 있으면 기존 상태를 그대로 돌려준다)
+    def open(self, account, ticker, initial_money):
+        with self._lock:
+            if account not in self._accounts:
+                self._accounts[account] = initial_money
+                self._conn.execute("INSERT OR IGNORE INTO accounts VALUES (?, ?)", (account, initial_money))
+                self._conn.commit()
+            return self._positions.setdefault((account, ticker), Position())
+
+    # 계좌의 기록을 모두 지운다 (같은 이름으로 백테스트를 다시 돌릴 때)
+    def reset(self, account):
+        with self._lock:
+            self._flush_locked()
+            self._accounts.pop(account, None)
+            for key in [k for k in self._positions if k[0] == account]:
+                del self._positions[key]
+            self._dirty = {k for k in self._dirty if k[0] != account}
+            for table in ("accounts", "positions", "fills"):
+                self._conn.execute(f"DELETE FROM {table} WHERE account = ?", (account,))
+            self._conn.commit()
+
+    def record(self, account, ticker, side, quantity, price, ts=None):
+        with self._lock:
+            position = self._positions.setdefault((account, ticker), Position())
+            position.apply(side, quantity, price)
+            self._pending.append((ts or time.time(), account, ticker, side, quantity, price))
+            self._dirty.add((account, ticker))
+            self._maybe_flush_locked()
+        return position
+
+    def note(self, account, ticker, prev_res):
+        with self._lock:
+            self._positions.setdefault((account, ticker), Position()).prev_res = prev_res
+            self._dirty.add((account, ticker))
+            self._maybe_flush_locked()
+
+    def _maybe_flush_locked(self):
+        due = self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval
+        if len(self._pending) >= self.batch_size or due:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._pending:
+            self._conn.executemany(
+                "INSERT INTO fills (ts, account, ticker, side, quantity, price) VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending,
+            )
+        if self._dirty:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(account, ticker, *self._positions[(account, ticker)].row()) for account, ticker in self._dirty],
+            )
+        if self._pending or self._dirty:
+            self._conn.commit()
+        self._pending = []
+        self._dirty = set()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def position(self, account, ticker):
+        with self._lock:
+            return self._positions.get((account, ticker))
+
+    def cash(self, account):
+        with self._lock:
+            flows = sum(p.cash_flow for (a, _), p in self._positions.items() if a == account)
+            return self._accounts.get(account, 0.0) + flows
+
+    def pnl(self, account, ticker, price):
+        position = self.position(account, ticker) or Position()
+        return {
+            "count": position.count,
+            "avg_cost": position.avg_cost,
+            "realized": position.realized,
+            "unrealized": position.unrealized(price),
+        }
+
+    def fills(self, account, ticker=None):
+        self.flush()
+        query = "SELECT ts, ticker, side, quantity, price FROM fills WHERE account = ?"
+        params = [account]
+        if ticker is not None:
+            query += " AND ticker = ?"
+            params.append(ticker)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY seq", params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
@@ -0,0 +1,214 @@
+import datetime
+import threading
+import time
+from functools import lru_cache
+import pytz
+from metrics import inc
+
+
+# 뉴욕 증권거래소(NYSE) 거래일 / 세션 달력 (외부 의존성 없이 규칙으로 계산)
+NY_TZ = pytz.timezone("America/New_York")
+PRE_OPEN = datetime.time(4, 0)
+REGULAR_OPEN = datetime.time(9, 30)
+REGULAR_CLOSE = datetime.time(16, 0)
+HALF_DAY_CLOSE = datetime.time(13, 0)
+POST_HOURS = datetime.timedelta(hours=4)  # 정규장 마감 후 시간외 거래 시간
+SESSIONS = ("pre", "regular", "post")
+
+
+def _nth_weekday(year, month, weekday, n):
+    first = datetime.date(year, month, 1)
+    return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _last_weekday(year, month, weekday):
+    last = datetime.date(year, month + 1, 1) - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    # 그레고리력 부활절 (Anonymous Gregorian algorithm)
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _observed(day):
+    # 토요일이면 전날 금요일, 일요일이면 다음 월요일에 쉰다
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=64)
+def nyse_holidays(year):
+    days = {
+        _nth_weekday(year, 1, 0, 3),              # 마틴 루터 킹 데이
+        _nth_weekday(year, 2, 0, 3),              # 대통령의 날
+        _easter(year) - datetime.timedelta(days=2),  # 성금요일
+        _last_weekday(year, 5, 0),                # 메모리얼 데이
+        _observed(datetime.date(year, 7, 4)),     # 독립기념일
+        _nth_weekday(year, 9, 0, 1),              # 노동절
+        _nth_weekday(year, 11, 3, 4),             # 추수감사절
+        _observed(datetime.date(year, 12, 25)),   # 크리스마스
+    }
+    # 신정이 토요일이면 전년도 12/31 에 쉬지 않는다 (NYSE 규칙)
+    new_year = datetime.date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    if year >= 2022:
+        days.add(_observed(datetime.date(year, 6, 19)))  # 준틴스
+    return frozenset(days)
+
+
+@lru_cache(maxsize=64)
+def nyse_half_days(year):
+    days = {_nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1)}  # 추수감사절 다음 날
+    for day in (datetime.date(year, 7, 3), datetime.date(year, 12, 24)):  # 독립기념일 / 크리스마스 전날
+        if day.weekday() < 5:
+            days.add(day)
+    return frozenset(d for d in days if d not in nyse_holidays(year))
+
+
+class MarketCalendar:
+    def __init__(self, tz=NY_TZ, extra_holidays=()):
+        self.tz = tz
+        self.extra_holidays = set(extra_holidays)
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and day not in nyse_holidays(day.year) and day not in self.extra_holidays
+
+    def is_half_day(self, day):
+        return day in nyse_half_days(day.year)
+
+    def _at(self, day, clock):
+        return self.tz.localize(datetime.datetime.combine(day, clock))
+
+    # 거래일의 세션별 (시작, 끝) 시각. 거래일이 아니면 빈 dict.
+    def sessions(self, day):
+        if not self.is_trading_day(day):
+            return {}
+        close = self._at(day, HALF_DAY_CLOSE if self.is_half_day(day) else REGULAR_CLOSE)
+        regular_open = self._at(day, REGULAR_OPEN)
+        return {
+            "pre": (self._at(day, PRE_OPEN), regular_open),
+            "regular": (regular_open, close),
+            "post": (close, close + POST_HOURS),
+        }
+
+    def now(self):
+        return datetime.datetime.now(self.tz)
+
+    # 현재 세션 이름: "pre" / "regular" / "post" / "closed"
+    def session(self, when=None):
+        when = (when or self.now()).astimezone(self.tz)
+        for name, (start, end) in self.sessions(when.date()).items():
+            if start <= when < end:
+                return name
+        return "closed"
+
+    def is_open(self, when=None, sessions=("regular",)):
+        return self.session(when) in sessions
+
+    # when 이후 처음 열리는 세션의 (시작, 끝). 이미 열려 있으면 현재 세션.
+    def next_session(self, when=None, sessions=("regular",)):
+        when = (when or self.now()).astimezone(self.tz)
+        day = when.date()
+        for _ in range(15):
+            for name in SESSIONS:
+                if name not in sessions:
+                    continue
+                bounds = self.sessions(day).get(name)
+                if bounds and bounds[1] > when:
+                    return bounds
+            day += datetime.timedelta(days=1)
+        return None
+
+
+_default_calendar = MarketCalendar()
+
+
+def get_market_calendar():
+    return _default_calendar
+
+
+# 봉 마감 시각 + offset 에 맞춰 실행하는 스케줄러
+# - 장이 열린 세션 안의 봉 마감에만 실행하고, 장이 닫혀 있으면 다음 세션까지 잔다
+# - 실행이 다음 마감 시각을 넘기면 policy 에 따라 밀린 회차를 바로 실행(catchup)하거나 건너뛴다(skip)
+class TickScheduler:
+    def __init__(self, interval=60, offset=2.0, calendar=None, sessions=("regular",), policy="skip",
+                 max_catchup=3, clock=time.time):
+        if policy not in ("skip", "catchup"):
+            raise ValueError(f"알 수 없는 정책: {policy}")
+        self.interval = interval
+        self.offset = offset          # 봉 마감 후 데이터가 반영될 때까지 기다리는 시간 (초)
+        self.calendar = calendar or get_market_calendar()
+        self.sessions = sessions
+        self.policy = policy
+        self.max_catchup = max_catchup
+        self.clock = clock
+        self.stats = {"runs": 0, "skipped": 0, "caught_up": 0, "errors": 0}
+
+    # after(epoch 초) 보다 뒤에 오는 실행 시각 (epoch 초)
+    def next_fire(self, after):
+        when = datetime.datetime.fromtimestamp(after - self.offset, self.calendar.tz)
+        for _ in range(30):
+            bounds = self.calendar.next_session(when, self.sessions)
+            if bounds is None:
+                return None
+            start, end = bounds[0].timestamp(), bounds[1].timestamp()
+            k = max(1, int((after - self.offset - start) // self.interval) + 1)
+            close = start + k * self.interval
+            if close <= end:
+                return close + self.offset
+            when = bounds[1]  # 이 세션의 마지막 봉은 지났으니 다음 세션으로
+        return None
+
+    def _wait_until(self, target, stop):
+        # 긴 대기(주말 등)는 나눠서 자면서 시계 변화나 종료 요청을 확인
+        while not stop.is_set():
+            remaining = target - self.clock()
+            if remaining <= 0:
+                return
+            stop.wait(min(remaining, 300))
+
+    def run(self, fn, stop=None):
+        stop = stop or threading.Event()
+        fire = self.next_fire(self.clock())
+        caught_up = 0
+        while fire is not None and not stop.is_set():
+            self._wait_until(fire, stop)
+            if stop.is_set():
+                break
+            try:
+                fn()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"틱 실행 오류: {e}")
+            self.stats["runs"] += 1
+
+            upcoming = self.next_fire(fire)
+            now = self.clock()
+            if upcoming is not None and upcoming <= now:
+                if self.policy == "catchup" and caught_up < self.max_catchup:
+                    caught_up += 1
+                    self.stats["caught_up"] += 1
+                    fire = upcoming
+                    continue
+                # 밀린 회차는 버리고 다음 마감 시각에 맞춘다
+                fire = self.next_fire(now)
+                missed = int((now - upcoming) // self.interval) + 1
+                self.stats["skipped"] += missed
+                inc("ticks_skipped_total", missed)
+            else:
+                fire = upcoming
+            caught_up = 0
@@ -0,0 +1,298 @@
+import datetime
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import pytz
+import yfinance as yf
+
+
+# interval 별 캐시 유지 시간 (초). 분봉은 마지막 봉이 계속 바뀌므로 1분 안팎만 유지한다.
+INTERVAL_TTL = {
+    "1m": 30,
+    "2m": 60,
+    "5m": 60,
+    "15m": 60,
+    "30m": 60,
+    "60m": 60,
+    "90m": 60,
+    "1h": 60,
+    "1d": 3600,
+    "5d": 3600,
+    "1wk": 6 * 3600,
+    "1mo": 12 * 3600,
+    "3mo": 12 * 3600,
+}
+DEFAULT_TTL = 60
+INFO_TTL = 24 * 3600  # 기업 정보는 하루 한 번, 뉴욕 기준 날짜가 바뀌면 갱신
+INFO_TZ = pytz.timezone("America/New_York")
+
+
+# 다음 날짜 경계(자정)까지 남은 초
+def seconds_until_next_day(tz=INFO_TZ, now=None):
+    now = now or datetime.datetime.now(tz)
+    tomorrow = tz.localize(datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time()))
+    return max((tomorrow - now).total_seconds(), 1.0)
+
+
+# 실제 데이터 소스 (yfinance). 테스트에서는 같은 메서드를 가진 가짜 소스로 교체한다.
+class YFinanceSource:
+    def history(self, ticker, period=None, interval="1d", start=None, end=None):
+        kwargs = {"interval": interval}
+        if start is not None:
+            kwargs["start"] = start
+            if end is not None:
+                kwargs["end"] = end
+        else:
+            kwargs["period"] = period or "1mo"
+        return yf.Ticker(ticker).history(**kwargs)
+
+    def info(self, ticker):
+        return yf.Ticker(ticker).info
+
+
+# 진행 중인 요청 하나 (같은 키의 동시 요청은 이 결과를 함께 기다린다)
+class _InflightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# 재시작 후에도 캐시를 유지하기 위한 디스크 저장소 (키마다 pickle 파일 하나)
+# 만료 시각은 재시작과 무관하도록 벽시계(epoch) 기준으로 기록한다.
+# 증분 요청(start=...)마다 키가 달라지므로 만료된 파일은 읽을 때 지우고,
+# sweep_every 번 쓸 때마다 max_age 가 지난 파일과 max_entries 를 넘는 오래된 파일을 정리한다.
+class DiskCache:
+    def __init__(self, path, clock=time.time, max_entries=2000, max_age=INFO_TTL, sweep_every=50):
+        self.path = path
+        self.clock = clock
+        self.max_entries = max_entries
+        self.max_age = max_age  # 가장 긴 TTL 보다 길면 이보다 오래된 파일은 모두 만료된 것
+        self.sweep_every = sweep_every
+        self._puts = 0
+        self._sweep_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.sweep()
+
+    # 파일 이름 앞부분은 종목을 알아보기 위한 것일 뿐이므로 안전한 문자만 남긴다 ("BRK/B", "../x" 가 경로가 되지 않도록)
+    # 실제 구분은 키 전체의 해시로 한다.
+    @staticmethod
+    def _prefix(ticker):
+        return re.sub(r"[^A-Za-z0-9.\-]", "_", str(ticker)).lstrip(".")[:32] or "_"
+
+    def _file(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, f"{self._prefix(key[1])}_{digest}.pkl")  # key = (종류, ticker, ...)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, key):
+        path = self._file(key)
+        try:
+            with open(path, "rb") as f:
+                expires_at, stored_key, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            self._remove(path)  # 깨진 파일
+            return None
+        if stored_key != key:
+            return None
+        if expires_at <= self.clock():
+            self._remove(path)
+            return None
+        return value, expires_at - self.clock()
+
+    def put(self, key, ttl, value):
+        # 쓰는 도중 읽는 쪽이 깨진 파일을 보지 않도록 임시 파일에 쓴 뒤 교체
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((self.clock() + ttl, key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._file(key))
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            self._remove(tmp)
+            return
+        except BaseException:
+            self._remove(tmp)
+            raise
+
+        self._puts += 1
+        if self._puts % self.sweep_every == 0:
+            self.sweep()
+
+    # 오래된 파일 / 남은 임시 파일 정리, 개수 상한을 넘으면 오래된 것부터 삭제
+    def sweep(self):
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            now = self.clock()
+            files = []
+            for entry in os.scandir(self.path):
+                if not entry.name.endswith((".pkl", ".tmp")):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime
+                except OSError:
+                    continue
+                if now - mtime > self.max_age:
+                    self._remove(entry.path)
+                elif entry.name.endswith(".pkl"):
+                    files.append((mtime, entry.path))
+            if len(files) > self.max_entries:
+                files.sort()
+                for _, path in files[:len(files) - self.max_entries]:
+                    self._remove(path)
+        finally:
+            self._sweep_lock.release()
+
+    def clear(self, ticker=None):
+        for name in os.listdir(self.path):
+            if name.endswith(".pkl") and (ticker is None or name.startswith(f"{self._prefix(ticker)}_")):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+
+def _copy(value):
+    # 캐시에 보관된 객체를 호출자가 수정하지 못하도록 사본을 넘긴다
+    return value.copy() if hasattr(value, "copy") else value
+
+
+# 프로세스 전체에서 공유하는 시세 캐시
+# - 동일한 요청이 동시에 들어오면 한 번만 받아온다 (singleflight)
+# - interval 에 따라 TTL 을 다르게 적용하고, 최대 개수를 넘으면 가장 오래 안 쓴 항목부터 제거 (LRU)
+# - disk 를 주면 메모리에 없을 때 디스크에서 먼저 찾고, 받아온 결과도 디스크에 남긴다
+class MarketDataCache:
+    def __init__(self, source=None, max_entries=512, ttl=None, info_ttl=INFO_TTL, clock=time.monotonic, disk=None):
+        self.source = source or YFinanceSource()
+        self.max_entries = max_entries
+        self.ttl = dict(INTERVAL_TTL, **(ttl or {}))
+        self.info_ttl = info_ttl
+        self.clock = clock
+        self.disk = disk
+        self._entries = OrderedDict()  # key -> (만료 시각, 값)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "errors": 0, "disk_hits": 0}
+
+    def _load(self, key, ttl, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return _copy(entry[1])
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _InflightCall()
+                self._inflight[key] = call
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return _copy(call.result)
+
+        try:
+            stored = self.disk.get(key) if self.disk is not None else None
+            if stored is not None:
+                call.result, ttl = stored
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+            else:
+                call.result = loader()
+                if self.disk is not None and not getattr(call.result, "empty", False):
+                    self.disk.put(key, ttl, call.result)
+        except BaseException as e:
+            # KeyboardInterrupt / SystemExit 등으로 중단되어도 기다리는 요청이 None 을 받지 않도록 같은 오류를 전달
+            call.error = e
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                # 빈 결과는 일시적인 실패일 수 있으므로 캐시하지 않는다
+                if call.error is None and call.result is not None and not getattr(call.result, "empty", False):
+                    self._store(key, ttl, call.result)
+            call.event.set()
+        return _copy(call.result)
+
+    def _store(self, key, ttl, value):
+        self._entries[key] = (self.clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def ttl_for(self, interval):
+        return self.ttl.get(interval, DEFAULT_TTL)
+
+    def history(self, ticker, period=None, interval="1d", start=None, end=None):
+        key = ("history", ticker, period, interval, start, end)
+        return self._load(
+            key,
+            self.ttl_for(interval),
+            lambda: self.source.history(ticker, period=period, interval=interval, start=start, end=end),
+        )
+
+    def info(self, ticker):
+        ttl = min(self.info_ttl, seconds_until_next_day())
+        return self._load(("info", ticker), ttl, lambda: self.source.info(ticker))
+
+    def invalidate(self, ticker=None):
+        with self._lock:
+            for key in [k for k in self._entries if ticker is None or k[1] == ticker]:
+                del self._entries[key]
+        if self.disk is not None:
+            self.disk.clear(ticker)
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return (self.stats["hits"] + self.stats["coalesced"] + self.stats["disk_hits"]) / total if total else 0.0
+
+
+_default_cache = None
+_default_cache_guard = threading.Lock()
+
+
+def get_market_data():
+    global _default_cache
+    with _default_cache_guard:
+        if _default_cache is None:
+            # MARKET_DATA_CACHE_DIR 을 지정하면 재시작 후에도 받아둔 시세 / 기업 정보를 재사용
+            cache_dir = os.getenv("MARKET_DATA_CACHE_DIR")
+            # BAR_STORE_DIR 을 지정하면 봉 데이터는 로컬 열 저장소에서 읽고, 새 봉만 yfinance 에 요청
+            from bar_store import BarStoreSource, get_bar_store
+            store = get_bar_store()
+            _default_cache = MarketDataCache(
+                source=BarStoreSource(store) if store is not None else None,
+                disk=DiskCache(cache_dir) if cache_dir else None
+            )
+        return _default_cache
+
+
+# 테스트나 다른 데이터 소스를 쓸 때 프로세스 전역 캐시를 교체
+def set_market_data(cache):
+    global _default_cache
+    with _default_cache_guard:
+        _default_cache = cache
@@ -0,0 +1,170 @@
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+# 판단 루프 계측 (구간 시간 히스토그램 + 카운터)
+# 프로세스 전체에서 하나의 레지스트리를 공유하고, Prometheus 텍스트 형식으로 내보낼 수 있다.
+#   with span("decision_stage_seconds", stage="fetch"): ...
+#   inc("llm_retries_total")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RECENT_SAMPLES = 2048  # 분위수 계산에 쓰는 최근 표본 수
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 마지막 칸은 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantiles(self, qs=(50, 95, 99)):
+        if not self.recent:
+            return {q: None for q in qs}
+        values = np.percentile(np.fromiter(self.recent, dtype=float), qs)
+        return dict(zip(qs, values.tolist()))
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}  # name -> {label_key: Histogram}
+        self._counters = {}    # name -> {label_key: 값}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(self.buckets)
+            hist.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    @contextmanager
+    def span(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # 대시보드용 요약 (히스토그램별 건수 / 평균 / p50 / p95 / p99)
+    def summary(self):
+        rows = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                for key, hist in sorted(series.items()):
+                    q = hist.quantiles()
+                    rows.append({
+                        "name": name,
+                        "labels": dict(key),
+                        "count": hist.count,
+                        "mean": hist.sum / hist.count if hist.count else None,
+                        "p50": q[50],
+                        "p95": q[95],
+                        "p99": q[99],
+                    })
+        return rows
+
+    def counters(self):
+        with self._lock:
+            return {name: {key: value for key, value in series.items()} for name, series in self._counters.items()}
+
+    def export_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+_default_registry = MetricsRegistry()
+
+
+def get_metrics():
+    return _default_registry
+
+
+def span(name, **labels):
+    return _default_registry.span(name, **labels)
+
+
+def observe(name, value, **labels):
+    _default_registry.observe(name, value, **labels)
+
+
+def inc(name, value=1, **labels):
+    _default_registry.inc(name, value, **labels)
+
+
+# Prometheus 가 긁어갈 수 있도록 /metrics 를 내보내는 HTTP 서버 (데몬 스레드)
+# 기본은 로컬에서만 접속 가능. 다른 호스트의 Prometheus 가 긁어가야 하면 METRICS_HOST=0.0.0.0 으로 연다.
+def start_http_server(port=None, registry=None, host=None):
+    port = int(port or os.getenv("METRICS_PORT", 9108))
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    registry = registry or _default_registry
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.export_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,148 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+# 일별 종가 이력으로 향후 수익률 분포를 직접 계산하는 Monte Carlo 엔진
+# - gbm: 로그수익률의 평균/표준편차를 추정한 기하 브라운 운동 (만기 값은 정규분포에서 바로 뽑는다)
+# - bootstrap: 과거 일별 로그수익률을 복원 추출해서 이어 붙인 경로
+# 결과(분위수, VaR/CVaR, 샤프 비율)는 프롬프트에 계산된 숫자로 들어간다.
+TRADING_DAYS = 252
+DEFAULT_HORIZONS = (30, 90)
+DEFAULT_PATHS = 100_000
+BOOTSTRAP_PATHS = 20_000    # bootstrap 은 경로마다 horizon 개의 난수가 필요해서 기본 경로 수를 줄인다
+DEFAULT_SEED = 42           # 같은 입력이면 같은 프롬프트가 나오도록 (판단 캐시 적중)
+CHUNK_ELEMENTS = 4_000_000  # bootstrap 한 번에 만드는 난수 개수 상한 (float64 기준 약 32MB)
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def log_returns(prices):
+    prices = np.asarray(prices, dtype=float)
+    prices = prices[np.isfinite(prices) & (prices > 0)]
+    return np.diff(np.log(prices))
+
+
+def estimate_params(returns):
+    return float(returns.mean()), float(returns.std(ddof=1)) if len(returns) > 1 else 0.0
+
+
+# horizon 거래일 뒤의 누적 수익률 (단순 수익률) 표본
+def simulate_returns(returns, horizon, n_paths=DEFAULT_PATHS, method="gbm", seed=None, chunk_elements=CHUNK_ELEMENTS):
+    rng = np.random.default_rng(seed)
+    returns = np.asarray(returns, dtype=float)
+    if method == "gbm":
+        mu, sigma = estimate_params(returns)
+        # mu, sigma 는 로그수익률 기준이므로 horizon 일 누적 로그수익률 ~ N(mu * h, sigma^2 * h)
+        log_total = rng.standard_normal(n_paths) * (sigma * np.sqrt(horizon)) + mu * horizon
+        return np.expm1(log_total)
+    if method == "bootstrap":
+        chunk = max(chunk_elements // max(horizon, 1), 1)
+        out = np.empty(n_paths)
+        for start in range(0, n_paths, chunk):
+            stop = min(start + chunk, n_paths)
+            picks = rng.integers(0, len(returns), size=(stop - start, horizon))
+            out[start:stop] = returns[picks].sum(axis=1)
+        return np.expm1(out)
+    raise ValueError(f"알 수 없는 시뮬레이션 방식: {method}")
+
+
+# 수익률 표본의 요약 통계. VaR/CVaR 은 손실을 양수로 표기한다.
+def risk_summary(samples, horizon, confidence=0.95, risk_free=0.0):
+    samples = np.asarray(samples, dtype=float)
+    qs = np.percentile(samples, PERCENTILES)
+    var_cut = np.percentile(samples, (1 - confidence) * 100)
+    tail = samples[samples <= var_cut]
+    mean = float(samples.mean())
+    std = float(samples.std())
+    excess = mean - risk_free * horizon / TRADING_DAYS
+    return {
+        "horizon": horizon,
+        "mean": mean,
+        "std": std,
+        "percentiles": {p: float(q) for p, q in zip(PERCENTILES, qs)},
+        "prob_profit": float((samples > 0).mean()),
+        "var": float(-var_cut),
+        "cvar": float(-tail.mean()) if len(tail) else float(-var_cut),
+        "confidence": confidence,
+        "sharpe": excess / std * np.sqrt(TRADING_DAYS / horizon) if std > 0 else 0.0,  # 연율화
+    }
+
+
+# 과거 일별 수익률 기준 연율화 샤프 비율
+def historical_sharpe(returns, risk_free=0.0):
+    if len(returns) < 2:
+        return 0.0
+    simple = np.expm1(returns)
+    excess = simple - risk_free / TRADING_DAYS
+    std = simple.std(ddof=1)
+    return float(excess.mean() / std * np.sqrt(TRADING_DAYS)) if std > 0 else 0.0
+
+
+def monte_carlo_report(prices, horizons=DEFAULT_HORIZONS, n_paths=None, methods=("gbm", "bootstrap"),
+                       seed=DEFAULT_SEED, confidence=0.95, risk_free=0.0):
+    paths = n_paths or {"gbm": DEFAULT_PATHS, "bootstrap": BOOTSTRAP_PATHS}
+    if not isinstance(paths, dict):
+        paths = {method: paths for method in methods}
+    returns = log_returns(prices)
+    if len(returns) < 20:
+        return None
+    mu, sigma = estimate_params(returns)
+    report = {
+        "n_paths": paths,
+        "daily_mu": mu,
+        "daily_sigma": sigma,
+        "annual_vol": sigma * np.sqrt(TRADING_DAYS),
+        "historical_sharpe": historical_sharpe(returns, risk_free),
+        "results": {},
+    }
+    for i, method in enumerate(methods):
+        for j, horizon in enumerate(horizons):
+            sub_seed = None if seed is None else seed + 1000 * i + j
+            samples = simulate_returns(returns, horizon, paths[method], method, sub_seed)
+            report["results"][(method, horizon)] = risk_summary(samples, horizon, confidence, risk_free)
+    return report
+
+
+# 일봉 이력은 하루에 한 번만 바뀌므로 같은 이력에 대한 결과는 재사용
+_report_cache = OrderedDict()
+_report_cache_lock = threading.Lock()
+REPORT_CACHE_SIZE = 64
+
+
+# key 를 주면 (예: (종목, 마지막 일봉 날짜)) 가격 배열 대신 그 값으로 찾는다.
+# 장중에 마지막 일봉 종가가 바뀌어도 같은 날에는 다시 계산하지 않는다.
+def cached_report(prices, key=None, **kwargs):
+    prices = np.ascontiguousarray(prices, dtype=float)
+    key = (key if key is not None else prices.tobytes(), tuple(sorted(kwargs.items())))
+    with _report_cache_lock:
+        if key in _report_cache:
+            _report_cache.move_to_end(key)
+            return _report_cache[key]
+    report = monte_carlo_report(prices, **kwargs)
+    with _report_cache_lock:
+        _report_cache[key] = report
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+    return report
+
+
+METHOD_LABELS = {"gbm": "GBM", "bootstrap": "부트스트랩"}
+
+
+# 프롬프트용 한국어 요약
+def describe_report(report):
+    if not report:
+        return "이력이 부족해서 시뮬레이션을 계산하지 못했어"
+    lines = [
+        f"일 평균 로그수익률 {report['daily_mu'] * 100:.3f}%, "
+        f"연 변동성 {report['annual_vol'] * 100:.1f}%, 과거 1년 샤프 비율 {report['historical_sharpe']:.2f}"
+    ]
+    for (method, horizon), r in report["results"].items():
+        p = r["percentiles"]
+        lines.append(
+            f"- {METHOD_LABELS.get(method, method)} {report['n_paths'][method]:,}개 경로 {horizon}일: 평균 {r['mean'] * 100:+.1f}%, "
+            f"분위수(5/25/50/75/95) {p[5] * 100:+.1f}/{p[25] * 100:+.1f}/{p[50] * 100:+.1f}/{p[75] * 100:+.1f}/{p[95] * 100:+.1f}%, "
+            f"수익 확률 {r['prob_profit'] * 100:.0f}%, VaR{r['confidence'] * 100:.0f} {r['var'] * 100:.1f}%, "
+            f"CVaR {r['cvar'] * 100:.1f}%, 샤프 {r['sharpe']:.2f}"
+        )
+    return "\n".join(lines)
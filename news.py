@@ -0,0 +1,171 @@
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+
+
+# Alpaca 뉴스 API. 테스트에서는 로컬 가짜 서버 주소로 바꿔서 쓴다 (ALPACA_NEWS_URL 또는 base_url)
+NEWS_BASE_URL = "https://data.alpaca.markets"
+NEWS_PATH = "/v1beta1/news"
+PAGE_LIMIT = 50  # Alpaca 한 페이지 최대 개수
+
+
+def clean_html(html):
+    return BeautifulSoup(html or "", "html.parser").get_text().strip()
+
+
+# 종목별 뉴스를 증분으로 받아 보관하는 수집기
+# - 연결을 재사용하는 Session 하나로 여러 종목을 동시에 요청
+# - 종목별로 마지막으로 본 기사 시각(watermark) 이후만 요청하고, 기사 id 로 중복 제거
+# - 본문 HTML 은 기사마다 한 번만 파싱해서 정리된 텍스트로 보관
+class NewsFeed:
+    def __init__(self, api_key=None, secret_key=None, base_url=None, lookback=datetime.timedelta(days=1),
+                 refresh=60, max_workers=8, max_articles=100, session=None, timeout=10, error_refresh=10):
+        self.base_url = (base_url or os.getenv("ALPACA_NEWS_URL") or NEWS_BASE_URL).rstrip("/")
+        self.lookback = lookback
+        self.refresh = refresh            # 같은 종목은 이 시간(초) 안에는 다시 요청하지 않음
+        self.error_refresh = error_refresh  # 마지막 요청이 실패한 종목은 이 시간(초) 뒤에 다시 시도
+        self.max_workers = max_workers
+        self.max_articles = max_articles  # 종목별 보관 개수
+        self.timeout = timeout
+        self.session = session or self._make_session(max_workers)
+        self.session.headers.update({
+            "accept": "application/json",
+            "APCA-API-KEY-ID": api_key or os.getenv("ALPACA_NORMAL_KEY") or "",
+            "APCA-API-SECRET-KEY": secret_key or os.getenv("ALPACA_SECRET_KEY") or "",
+        })
+        self._articles = {}   # symbol -> OrderedDict(id -> 기사), 최신순
+        self._watermark = {}  # symbol -> 마지막으로 본 기사의 created_at
+        self._fetched_at = {}
+        self._texts = {}      # 기사 id -> 정리된 본문 (여러 종목에 걸친 기사도 한 번만 파싱)
+        self._lock = threading.Lock()
+        self.errors = {}
+        self.stats = {"requests": 0, "articles": 0, "duplicates": 0, "parsed": 0}
+
+    @staticmethod
+    def _make_session(pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _request(self, params):
+        with self._lock:
+            self.stats["requests"] += 1
+        response = self.session.get(self.base_url + NEWS_PATH, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _clean(self, article):
+        article_id = article.get("id")
+        with self._lock:
+            text = self._texts.get(article_id)
+        if text is None:
+            text = clean_html(article.get("content", ""))
+            with self._lock:
+                self._texts[article_id] = text
+                self.stats["parsed"] += 1
+        return {
+            "id": article_id,
+            "headline": article.get("headline", "제목 없음"),
+            "summary": article.get("summary", ""),
+            "url": article.get("url", "#"),
+            "created_at": article.get("created_at", ""),
+            "symbols": article.get("symbols", []),
+            "content_clean": text,
+        }
+
+    # 한 종목의 새 기사만 받아서 반영. 새로 추가된 기사 수를 반환.
+    def fetch(self, symbol):
+        with self._lock:
+            watermark = self._watermark.get(symbol)
+            known = self._articles.setdefault(symbol, OrderedDict())
+        if watermark is None:
+            start = datetime.datetime.now(datetime.timezone.utc) - self.lookback
+            watermark = start.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        params = {"symbols": symbol, "start": watermark, "sort": "desc", "limit": PAGE_LIMIT, "include_content": "true"}
+        fresh = []
+        seen = set()
+        while True:
+            data = self._request(params)
+            for article in data.get("news", []):
+                with self._lock:
+                    duplicate = article.get("id") in known or article.get("id") in seen
+                    if duplicate:
+                        self.stats["duplicates"] += 1
+                if not duplicate:
+                    seen.add(article.get("id"))
+                    fresh.append(self._clean(article))
+            token = data.get("next_page_token")
+            if not token:
+                break
+            params["page_token"] = token
+
+        with self._lock:
+            merged = OrderedDict((a["id"], a) for a in sorted(fresh, key=lambda a: a["created_at"], reverse=True))
+            for article_id, article in self._articles.get(symbol, known).items():
+                merged.setdefault(article_id, article)
+            while len(merged) > self.max_articles:
+                dropped, _ = merged.popitem(last=True)
+                self._texts.pop(dropped, None)
+            self._articles[symbol] = merged
+            if merged:
+                self._watermark[symbol] = max(watermark, next(iter(merged.values()))["created_at"])
+            self._fetched_at[symbol] = time.monotonic()
+            self.errors.pop(symbol, None)
+            self.stats["articles"] += len(fresh)
+        return len(fresh)
+
+    # 실패한 종목은 watermark / 기사를 그대로 두고 짧은 간격(error_refresh) 뒤에 다시 받는다
+    def _stale(self, symbol):
+        fetched = self._fetched_at.get(symbol)
+        ttl = min(self.error_refresh, self.refresh) if symbol in self.errors else self.refresh
+        return fetched is None or time.monotonic() - fetched >= ttl
+
+    # 여러 종목을 동시에 갱신 (최근에 받은 종목은 건너뜀). 종목별 새 기사 수를 반환.
+    def update(self, symbols, force=False):
+        with self._lock:
+            targets = [s for s in dict.fromkeys(symbols) if force or self._stale(s)]
+            now = time.monotonic()
+            for symbol in targets:
+                self._fetched_at[symbol] = now  # 다른 세션이 같은 종목을 동시에 요청하지 않도록 먼저 표시
+        if not targets:
+            return {}
+
+        def run(symbol):
+            try:
+                return self.fetch(symbol)
+            except Exception as e:
+                with self._lock:
+                    self.errors[symbol] = str(e)
+                return 0
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as pool:
+            return dict(zip(targets, pool.map(run, targets)))
+
+    def latest(self, symbol, limit=5):
+        with self._lock:
+            return list(self._articles.get(symbol, {}).values())[:limit]
+
+    def get(self, symbols, limit=5):
+        self.update(symbols)
+        return {symbol: self.latest(symbol, limit) for symbol in symbols}
+
+
+_default_feed = None
+_default_feed_guard = threading.Lock()
+
+
+def get_news_feed():
+    global _default_feed
+    with _default_feed_guard:
+        if _default_feed is None:
+            _default_feed = NewsFeed()
+        return _default_feed
@@ -0,0 +1,107 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from ai import StockDecisionAI
+from simulation import StockSimulator
+
+
+# 여러 종목을 하나의 현금 계좌로 운용하는 시뮬레이터
+# 데이터 수집과 의사결정은 스레드 풀에서 동시에 처리하고,
+# 주문 처리(현금 변경)는 메인 스레드에서 순서대로 적용한다.
+class PortfolioSimulator:
+    def __init__(
+        self,
+        tickers,
+        initial_money=10000,
+        model="o4-mini-2025-04-16",
+        decision_ai=None,
+        max_workers=16,
+        tick_deadline=45,
+        interval=60
+    ):
+        self.cash = initial_money
+        self.interval = interval
+        self.tick_deadline = tick_deadline  # 이 시간 안에 끝나지 않은 종목은 이번 틱에서 건너뜀
+        self.decision_ai = decision_ai or StockDecisionAI(model=model)
+        self.simulators = {
+            ticker: StockSimulator(ticker=ticker, initial_money=0, model=model, decision_ai=self.decision_ai)
+            for ticker in tickers
+        }
+        self.last_prices = {}
+        self.last_results = {}
+        self.skipped = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="portfolio")
+        self._inflight = {}  # ticker -> Future (이전 틱에서 아직 끝나지 않은 작업 포함)
+
+    # 작업 스레드에서 실행: 수집 + 판단 (계좌 상태는 바꾸지 않음)
+    def _work(self, sim, cash):
+        df = sim.collect()
+        if df.empty:
+            return None
+        return df['Close'].iloc[-1], sim.decide(df, current_money=cash)
+
+    # 공유 계좌에 주문 적용
+    def _apply(self, ticker, res, price):
+        sim = self.simulators[ticker]
+        sim.current_money = self.cash
+        result = sim.handle_decision(res, price)
+        self.cash = sim.current_money
+        sim.current_money = 0
+        self.last_prices[ticker] = price
+        return result
+
+    def tick(self):
+        cash = self.cash
+        futures = {}
+        skipped = []
+
+        for ticker, sim in self.simulators.items():
+            prev = self._inflight.get(ticker)
+            if prev is not None and not prev.done():
+                # 이전 틱의 작업이 아직 끝나지 않았으면 새로 제출하지 않는다
+                skipped.append(ticker)
+                continue
+            future = self._executor.submit(self._work, sim, cash)
+            self._inflight[ticker] = future
+            futures[future] = ticker
+
+        done, not_done = wait(futures, timeout=self.tick_deadline)
+        skipped.extend(futures[f] for f in not_done)
+
+        results = {}
+        for future in sorted(done, key=lambda f: futures[f]):
+            ticker = futures[future]
+            try:
+                out = future.result()
+            except Exception as e:
+                print(f"[{ticker}] 처리 중 오류 발생: {e}")
+                continue
+            if out is None:
+                continue
+            price, res = out
+            results[ticker] = self._apply(ticker, res, price)
+
+        self.skipped = skipped
+        if skipped:
+            print(f"⏱️ 마감 시간 초과로 건너뛴 종목: {', '.join(skipped)}")
+        self.last_results.update(results)
+        return results
+
+    def total_assets(self):
+        holdings = sum(
+            sim.current_count * self.last_prices.get(ticker, 0)
+            for ticker, sim in self.simulators.items()
+        )
+        return self.cash + holdings
+
+    def run(self):
+        try:
+            while True:
+                started = time.monotonic()
+                self.tick()
+                # 틱 소요 시간만큼 빼고 대기 (다음 틱이 밀리지 않도록)
+                time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -2,12 +2,15 @@ import os
 import datetime
 import pytz
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import quote
+import pandas as pd
 
 import streamlit as st
-import yfinance as yf
+from market_data import get_market_data
+from news import get_news_feed
+from candle_store import get_default_store
+from resample import get_resampler, base_interval
+from bar_store import get_bar_store
+from downsample import lttb, ohlc_downsample, max_points, max_candles, finer_interval, is_finer
 import plotly.graph_objects as go
 import alpaca_trade_api as tradeapi
 
@@ -45,13 +48,44 @@ def card(title, content):
         unsafe_allow_html=True
     )
 
+# 차트 확대 구간 선택
+# 선택한 구간이 좁아지면 원래 간격보다 세밀한 봉을 그 구간만 새로 받아온다 (yfinance 기간 제한 안에서)
+def zoom_chart_data(market_data, ticker, df, interval):
+    if len(df) <= max_candles():
+        return df
+
+    dates = df["Date"]
+    tz = dates.dt.tz if isinstance(dates.dtype, pd.DatetimeTZDtype) else None
+    naive = dates.dt.tz_localize(None) if tz is not None else dates
+    first, last = naive.iloc[0].to_pydatetime(), naive.iloc[-1].to_pydatetime()
+    lo, hi = st.slider("🔎 확대 구간", min_value=first, max_value=last, value=(first, last), format="YYYY-MM-DD HH:mm")
+    if (lo, hi) == (first, last):
+        return df
+
+    zoomed = df[((naive >= lo) & (naive <= hi)).to_numpy()]
+    start = pd.Timestamp(lo).tz_localize(tz) if tz is not None else pd.Timestamp(lo)
+    end = pd.Timestamp(hi).tz_localize(tz) if tz is not None else pd.Timestamp(hi)
+    fine = finer_interval(end - start, age=pd.Timestamp.now(tz=tz) - start)  # tz 가 None 이면 둘 다 시간대 없음
+    if is_finer(fine, interval) and len(zoomed) < max_candles():
+        detail = market_data.history(ticker, interval=fine, start=start, end=end + pd.Timedelta(days=1))
+        if not detail.empty:
+            detail = detail.reset_index()
+            detail.rename(columns={detail.columns[0]: "Date"}, inplace=True)
+            if isinstance(detail["Date"].dtype, pd.DatetimeTZDtype):
+                detail["Date"] = detail["Date"].dt.tz_convert(tz) if tz is not None else detail["Date"].dt.tz_localize(None)
+            detail = detail[(detail["Date"] >= start) & (detail["Date"] <= end)]
+            if len(detail) > len(zoomed):
+                st.caption(f"확대 구간은 {fine} 간격 데이터로 표시합니다.")
+                return detail
+    return zoomed
+
 # 기업 분석 탭
 def display_company_analysis(ticker):
     st.subheader(f"💡 {ticker} 기업 분석")
 
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        market_data = get_market_data()  # 세션 간 공유되는 캐시 (동일 요청은 한 번만 전송)
+        info = market_data.info(ticker)
 
         tab1, tab2, tab3 = st.tabs(["🏢 회사 정보", "📈 주가 차트", "📰 뉴스"])
 
@@ -79,20 +113,44 @@ def display_company_analysis(ticker):
             period = st.selectbox("기간 (period)", ["1d", "1mo", "6mo", "1y", "5y", "max"], index=2)
             interval = st.selectbox("간격 (interval)", ["1d", "60m", "15m", "5m", "1m"], index=0)
 
-            df = stock.history(period=period, interval=interval)
+            # 당일 봉은 프로세스 공유 저장소에서 읽는다 (수집기(collector.py)가 돌고 있으면 공유 메모리, 아니면 증분 요청)
+            df = get_default_store().get(ticker, interval=interval) if period == "1d" else None
+            if df is not None and not df.empty:
+                df = df.set_index("Datetime").tz_convert("America/New_York")
+            else:
+                # 분봉은 기간마다 기준 간격으로 한 번만 받고, 간격 변경은 로컬에서 다시 묶는다 (일봉은 yfinance 일봉 그대로)
+                base = base_interval(period, interval)
+                df = market_data.history(ticker, period=period, interval=base)
+                if base != interval and not df.empty:
+                    store = get_bar_store()
+                    if store is not None:
+                        # BAR_STORE_DIR 저장소가 있으면 위 요청이 갱신한 기준 봉 열을 그대로 묶는다
+                        df = get_resampler().from_store(store, ticker, base, interval, start=df.index[0])
+                    else:
+                        df = get_resampler().get(ticker, df, base, interval)
 
             if not df.empty:
-                df.reset_index(inplace=True)
+                df = df.reset_index()
+                df.rename(columns={df.columns[0]: "Date"}, inplace=True)  # 분봉은 'Datetime' 으로 내려온다
+
+                # 확대 구간 선택: 원본 해상도 데이터에서 다시 잘라 솎아낸다
+                df = zoom_chart_data(market_data, ticker, df, interval)
+
+                # 브라우저로 보내는 점 개수는 차트 폭 기준으로 제한 (종가 선은 LTTB, 캔들은 OHLC 묶음)
                 st.markdown(f"### 📉 주가 차트(Close, 최근 {period} 기준, {interval} 간격)")
-                st.line_chart(df.set_index("Date")["Close"], height=300)
+                line_df = lttb(df, max_points())
+                st.line_chart(line_df.set_index("Date")["Close"], height=300)
 
                 st.markdown("#### 🕯️ 캔들차트")
+                candle_df = ohlc_downsample(df, max_candles())
+                if len(candle_df) < len(df):
+                    st.caption(f"{len(df):,}개 봉을 {len(candle_df):,}개로 묶어서 표시합니다. 확대하면 세부 봉을 볼 수 있습니다.")
                 fig = go.Figure(data=[go.Candlestick(
-                    x=df["Date"],
-                    open=df["Open"],
-                    high=df["High"],
-                    low=df["Low"],
-                    close=df["Close"]
+                    x=candle_df["Date"],
+                    open=candle_df["Open"],
+                    high=candle_df["High"],
+                    low=candle_df["Low"],
+                    close=candle_df["Close"]
                 )])
                 fig.update_layout(template="plotly_white", height=500)
                 st.plotly_chart(fig, use_container_width=True)
@@ -103,33 +161,19 @@ def display_company_analysis(ticker):
         with tab3:
             st.markdown("#### 📰 관련 뉴스 기사")
             try:
-                # 날짜를 URL-safe하게 인코딩된 ISO 8601로 변환
-                start_iso = quote(one_day_ago.strftime('%Y-%m-%dT00:00:00Z'))
-                end_iso = quote(now_kst.strftime('%Y-%m-%dT00:00:00Z'))
-
-                url = (
-                    f"https://data.alpaca.markets/v1beta1/news"
-                    f"?start={start_iso}&end={end_iso}"
-                    f"&sort=desc&symbols={ticker}&limit=5&include_content=true"
-                )
-
-                headers = {
-                    "accept": "application/json",
-                    "APCA-API-KEY-ID": ALPACA_API_KEY,
-                    "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY
-                }
-
-                response = requests.get(url, headers=headers)
-                response.raise_for_status()
-                news_data = response.json().get("news", [])
+                # 세션 간 공유되는 뉴스 수집기: 새 기사만 받고, 본문은 기사마다 한 번만 파싱
+                feed = get_news_feed()
+                feed.update([ticker])
+                if ticker in feed.errors:
+                    raise RuntimeError(feed.errors[ticker])
+                news_data = feed.latest(ticker, limit=5)
 
                 if news_data:
                     for article in news_data:
                         headline = article.get("headline", "제목 없음")
                         summary = article.get("summary", "")
                         url_link = article.get("url", "#")
-                        content_html = article.get("content", "")
-                        content_clean = BeautifulSoup(content_html, "html.parser").get_text().strip()
+                        content_clean = article.get("content_clean", "")
 
                         card(
                             headline,
@@ -0,0 +1,194 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+# 기준 해상도 봉(1m 등)에서 5m / 15m / 60m / 1d 봉을 로컬에서 만든다
+# - 분봉 묶음은 거래소 시간대 기준 정규장 시작(9:30)에 맞춘다 (yfinance 와 같은 9:30, 10:30, ... 경계)
+# - 일봉은 정규장 봉만 모아 거래소 시간대 자정 시각으로 표시한다
+# - 결과는 (종목, 기준 간격, 목표 간격) 별로 보관하고, 기준 봉이 늘어나면 마지막 묶음부터만 다시 계산한다
+EXCHANGE_TZ = "America/New_York"
+SESSION_OPEN = pd.Timedelta(hours=9, minutes=30)
+SESSION_CLOSE = pd.Timedelta(hours=16)
+INTERVAL_MINUTES = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "90m": 90, "1h": 60, "1d": 390}
+NS_PER_MINUTE = 60 * 10 ** 9
+NS_PER_DAY = 86_400 * 10 ** 9
+
+# 기간별로 yfinance 가 내려주는 가장 촘촘한 간격 (분봉은 받을 수 있는 기간이 제한됨)
+PERIOD_BASE = {"1d": "1m", "5d": "1m", "1mo": "5m", "3mo": "60m", "6mo": "60m", "1y": "60m", "2y": "60m"}
+
+
+# period 차트를 그릴 때 받아 둘 기준 간격
+# 일봉은 배당 / 분할이 반영된 yfinance 일봉을 그대로 받는다 (분봉을 묶으면 조정 전 가격 / 다른 거래량이 된다).
+# 분봉 목표 간격만 기간별 기준 간격으로 받아 로컬에서 묶고, 목표가 기준보다 촘촘하면 목표 간격 그대로 받는다.
+def base_interval(period, interval):
+    if interval not in INTERVAL_MINUTES or interval == "1d":
+        return interval
+    base = PERIOD_BASE.get(period, "1d")
+    if base == "1d" or INTERVAL_MINUTES[interval] < INTERVAL_MINUTES[base]:
+        return interval
+    return base
+
+
+def can_resample(base, target):
+    if base not in INTERVAL_MINUTES or target not in INTERVAL_MINUTES:
+        return False
+    if target == "1d":
+        return True
+    if base == "1d":
+        return base == target
+    return INTERVAL_MINUTES[target] % INTERVAL_MINUTES[base] == 0
+
+
+# 각 봉이 속할 묶음의 시작 시각 (UTC ns). tz 는 거래소 시간대.
+def bucket_starts(index, target, tz=EXCHANGE_TZ):
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        index = index.tz_localize(tz)
+    local = index.tz_convert(tz)
+    wall = local.tz_localize(None).as_unit("ns").asi8  # 거래소 벽시계 시각
+    day = wall - wall % NS_PER_DAY
+    if target == "1d":
+        buckets = day
+    else:
+        width = INTERVAL_MINUTES[target] * NS_PER_MINUTE
+        anchor = day + SESSION_OPEN.value
+        buckets = anchor + np.floor_divide(wall - anchor, width) * width
+    # 벽시계 시각을 다시 거래소 시간대로 붙여 UTC 로 (서머타임 경계 처리)
+    return pd.DatetimeIndex(buckets).tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward").as_unit("ns").asi8
+
+
+# 정렬된 봉 시각(UTC ns)과 열 배열을 target 간격으로 묶는다. 열 배열은 memmap 뷰여도 된다 (복사 없이 집계).
+def aggregate(ts, columns, target, tz=EXCHANGE_TZ, out_tz=None):
+    ts = np.asarray(ts, dtype="<i8")
+    if target == "1d" and len(ts):
+        # 일봉은 정규장 봉만 모은다 (시간외 봉이 섞여 있어도 yfinance 일봉과 같게)
+        wall = pd.DatetimeIndex(pd.to_datetime(ts, utc=True)).tz_convert(tz).tz_localize(None)
+        offset = wall - wall.normalize()
+        keep = np.asarray((offset >= SESSION_OPEN) & (offset < SESSION_CLOSE))
+        if not keep.all():
+            ts = ts[keep]
+            columns = {name: np.asarray(values)[keep] for name, values in columns.items()}
+    name = "Date" if target == "1d" else "Datetime"
+    if len(ts) == 0:
+        index = pd.DatetimeIndex([], tz=out_tz or tz, name=name)
+        return pd.DataFrame({col: np.empty(0) for col in columns}, index=index)
+
+    buckets = bucket_starts(pd.to_datetime(ts, utc=True), target, tz)
+    starts = np.r_[0, np.flatnonzero(np.diff(buckets)) + 1]
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    reducers = {
+        "Open": lambda v: v[starts],
+        "High": lambda v: np.maximum.reduceat(v, starts),
+        "Low": lambda v: np.minimum.reduceat(v, starts),
+        "Close": lambda v: v[ends],
+        "Volume": lambda v: np.add.reduceat(v, starts),
+    }
+    out = {col: reducers[col](np.asarray(values, dtype=float)) for col, values in columns.items() if col in reducers}
+
+    result_index = pd.DatetimeIndex(pd.to_datetime(buckets[starts], utc=True)).tz_convert(out_tz or tz)
+    result_index.name = name
+    return pd.DataFrame(out, index=result_index)
+
+
+# yfinance 형태(DatetimeIndex + OHLCV) DataFrame 을 target 간격으로 묶는다. 입력과 같은 시간대로 돌려준다.
+def resample_ohlcv(df, target, tz=EXCHANGE_TZ):
+    if df.empty:
+        return df.iloc[:0]
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize(tz)
+    columns = {col: df[col].to_numpy() for col in ("Open", "High", "Low", "Close", "Volume") if col in df.columns}
+    return aggregate(index.tz_convert("UTC").as_unit("ns").asi8, columns, target, tz, out_tz=index.tz)
+
+
+class _Entry:
+    def __init__(self, frame, base_first, base_last, tail_start, tail_row):
+        self.frame = frame            # 묶은 결과
+        self.base_first = base_first  # 기준 봉 첫 시각 (UTC ns, 다른 구간이면 처음부터 다시)
+        self.base_last = base_last    # 마지막으로 반영한 기준 봉 시각 (UTC ns)
+        self.tail_start = tail_start  # 마지막(진행 중일 수 있는) 묶음의 시작 시각 (UTC ns)
+        self.tail_row = tail_row      # 마지막 묶음의 행 번호
+
+
+# 간격 변경을 네트워크 요청 없이 처리하는 로컬 리샘플러 (결과를 간격별로 보관 / 증분 갱신)
+class Resampler:
+    def __init__(self, tz=EXCHANGE_TZ, max_entries=64):
+        self.tz = tz
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (ticker, base, target) -> _Entry
+        self._lock = threading.Lock()
+        self.stats = {"full": 0, "incremental": 0}
+
+    # base_df: 기준 간격의 봉 전체 (DatetimeIndex 정렬). target 이 base 와 같으면 그대로 돌려준다.
+    def get(self, ticker, base_df, base, target):
+        if target == base or base_df is None or base_df.empty:
+            return base_df
+        index = pd.DatetimeIndex(base_df.index)
+        if index.tz is None:
+            index = index.tz_localize(self.tz)
+        columns = {col: base_df[col].to_numpy() for col in ("Open", "High", "Low", "Close", "Volume") if col in base_df.columns}
+        return self._get((ticker, base, target), index.tz_convert("UTC").as_unit("ns").asi8, columns, base, target,
+                         out_tz=index.tz)
+
+    # 로컬 봉 저장소(BarStore)의 기준 간격 열을 memmap 뷰 그대로 읽어서 묶는다 (DataFrame 변환 / 재다운로드 없음)
+    def from_store(self, store, ticker, base, target, start=None, end=None):
+        cols = store.columns(ticker, base)
+        view = cols.slice(*cols.rows(start, end))
+        columns = {col: view[field] for col, field in (("Open", "open"), ("High", "high"), ("Low", "low"),
+                                                       ("Close", "close"), ("Volume", "volume"))}
+        if target == base:
+            return cols.frame(*cols.rows(start, end))
+        return self._get((ticker, base, target, "store"), view["ts"], columns, base, target, out_tz=cols.tz)
+
+    def _get(self, key, ts, columns, base, target, out_tz):
+        if not can_resample(base, target):
+            raise ValueError(f"{base} 봉으로 {target} 봉을 만들 수 없습니다.")
+        if len(ts) == 0:
+            return aggregate(ts, columns, target, self.tz, out_tz)
+
+        first, last = int(ts[0]), int(ts[-1])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None and entry.base_first == first and last >= entry.base_last:
+            # 마지막 묶음 시작 이후의 기준 봉만 다시 묶어 이어 붙인다 (진행 중인 봉 값 변화 포함)
+            pos = int(np.searchsorted(ts, entry.tail_start))
+            tail = aggregate(ts[pos:], {col: values[pos:] for col, values in columns.items()}, target, self.tz, out_tz)
+            head = entry.frame.iloc[:entry.tail_row]
+            frame = pd.concat([head, tail]) if len(head) else tail
+            self.stats["incremental"] += 1
+        else:
+            frame = aggregate(ts, columns, target, self.tz, out_tz)
+            self.stats["full"] += 1
+
+        tail_start = frame.index[-1].value if len(frame) else first
+        with self._lock:
+            self._entries[key] = _Entry(frame, first, last, tail_start, max(len(frame) - 1, 0))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return frame.copy()  # 호출 측이 고쳐도 보관한 결과는 그대로
+
+    # 오늘(마지막 거래일) 일봉 한 개. 분봉이 없으면 None.
+    def today(self, ticker, base_df, base="1m"):
+        daily = self.get(ticker, base_df, base, "1d")
+        if daily is None or daily.empty:
+            return None
+        return daily.iloc[-1]
+
+    def clear(self, ticker=None):
+        with self._lock:
+            for key in [k for k in self._entries if ticker is None or k[0] == ticker]:
+                del self._entries[key]
+
+
+_default_resampler = Resampler()
+
+
+def get_resampler():
+    return _default_resampler
@@ -0,0 +1,197 @@
+import json
+import math
+import os
+import re
+from decision_backends import VALID_ACTIONS
+from metrics import inc
+
+
+# LLM 응답을 의사결정 dict 로 바꾸는 단계
+#   1. 응답 전체를 그대로 JSON 으로 읽기                      (path="direct")
+#   2. 코드 블록 / 앞뒤 설명이 섞여 있으면 첫 번째 균형 잡힌 {...} 추출  (path="extracted")
+#   3. 타입 보정 ("3" → 3, "$945.23" → 945.23, "1e3" → 1000, "BUY" → "buy")  (path="coerced")
+#   4. 그래도 안 되면 전체 판단을 다시 돌리지 않고 저렴한 모델에 형식만 고쳐 달라고 요청 (path="repaired")
+# 각 경로가 쓰인 횟수는 decision_parse_total{path} 카운터로 센다.
+REQUIRED_FIELDS = ("reason", "risk_type", "action", "quantity", "price")
+RISK_TYPES = ("안정적", "공격적")
+REPAIR_MODEL = os.getenv("OPENAI_REPAIR_MODEL", "gpt-4o-mini")
+
+DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reason": {"type": "string"},
+        "risk_type": {"type": "string", "enum": list(RISK_TYPES)},
+        "action": {"type": "string", "enum": list(VALID_ACTIONS)},
+        "quantity": {"type": "integer"},
+        "price": {"type": "number"},
+    },
+    "required": list(REQUIRED_FIELDS),
+    "additionalProperties": False,
+}
+
+# OpenAI 구조화 출력 (스키마에 맞는 JSON 만 생성)
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "stock_decision", "strict": True, "schema": DECISION_SCHEMA},
+}
+
+# Gemini response_schema 는 additionalProperties 를 받지 않는다
+GEMINI_RESPONSE_SCHEMA = {k: v for k, v in DECISION_SCHEMA.items() if k != "additionalProperties"}
+
+# 부호 / 통화 기호가 앞에 붙을 수 있는 10진수 하나 (지수 표기 포함). "3-5", "3주" 같은 값은 받지 않는다.
+_NUMBER = re.compile(r"[+-]?\$?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+class DecisionParseError(ValueError):
+    def __init__(self, message, raw=None):
+        super().__init__(message)
+        self.raw = raw
+
+
+# 문자열 안의 첫 번째 균형 잡힌 JSON 객체. 문자열 리터럴 안의 괄호는 세지 않는다.
+# required 키를 모두 가진 객체를 우선하고, 없으면 처음 찾은 객체를 돌려준다.
+def extract_json_object(text, required=REQUIRED_FIELDS):
+    first = None
+    start = text.find("{")
+    while start != -1:
+        depth, in_string, escaped = 0, False, False
+        for i in range(start, len(text)):
+            ch = text[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    try:
+                        obj = json.loads(text[start:i + 1])
+                    except json.JSONDecodeError:
+                        break
+                    if isinstance(obj, dict):
+                        if all(k in obj for k in required):
+                            return obj
+                        first = first or obj
+                    break
+        start = text.find("{", start + 1)
+    return first
+
+
+# 유한한 실수만 받는다 ("1e999", JSON Infinity / NaN 은 거부)
+def _to_number(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        text = str(value).strip().replace(",", "")
+        if _NUMBER.fullmatch(text) is None:
+            raise ValueError(value)
+        number = float(text.replace("$", ""))
+    if not math.isfinite(number):
+        raise ValueError(value)
+    return number
+
+
+# 스키마 타입에 맞게 보정하고 검증. (결과, 보정 여부) 를 반환, 맞출 수 없으면 DecisionParseError.
+def coerce_decision(obj, raw=None):
+    missing = [k for k in REQUIRED_FIELDS if k not in obj]
+    if missing:
+        raise DecisionParseError(f"응답 JSON에 필수 키가 없습니다: {', '.join(missing)}", raw)
+
+    res = dict(obj)
+    coerced = False
+
+    action = str(res["action"]).strip().lower()
+    if action not in VALID_ACTIONS:
+        raise DecisionParseError(f"유효하지 않은 액션: {res['action']}", raw)
+    coerced |= action != res["action"]
+    res["action"] = action
+
+    try:
+        quantity = _to_number(res["quantity"])
+        price = _to_number(res["price"])
+    except ValueError:
+        raise DecisionParseError("수량 또는 가격이 숫자가 아님", raw)
+    if quantity < 0 or quantity != int(quantity):
+        raise DecisionParseError(f"수량이 0 이상의 정수가 아님: {res['quantity']}", raw)
+    coerced |= type(res["quantity"]) is not int or type(res["price"]) not in (int, float)
+    res["quantity"], res["price"] = int(quantity), price
+
+    for key in ("reason", "risk_type"):
+        if not isinstance(res[key], str):
+            res[key] = "" if res[key] is None else str(res[key])
+            coerced = True
+    return res, coerced
+
+
+# 응답 메시지 본문. 구조화 출력이 거부(refusal)되었거나 본문이 비어 있으면 DecisionParseError.
+def message_text(message):
+    refusal = getattr(message, "refusal", None)
+    if refusal:
+        inc("llm_refusals_total")
+        raise DecisionParseError(f"모델이 응답을 거부했습니다: {refusal}")
+    content = getattr(message, "content", None)
+    if content is None:
+        raise DecisionParseError("응답 본문이 비어 있습니다.")
+    return content.strip()
+
+
+# 모델 응답 문자열 → 의사결정 dict. (결과, 경로) 를 반환한다.
+def parse_response(raw):
+    text = (raw or "").strip()
+    path = "direct"
+    try:
+        obj = json.loads(text)
+    except json.JSONDecodeError:
+        obj = None
+    if not isinstance(obj, dict):
+        obj = extract_json_object(text)
+        path = "extracted"
+        if obj is None:
+            raise DecisionParseError("응답에서 JSON 객체를 찾을 수 없습니다.", raw)
+
+    res, coerced = coerce_decision(obj, raw)
+    if coerced and path == "direct":
+        path = "coerced"
+    return res, path
+
+
+def parse_decision(raw):
+    try:
+        res, path = parse_response(raw)
+    except DecisionParseError:
+        inc("decision_parse_total", path="failed")
+        raise
+    inc("decision_parse_total", path=path)
+    return res
+
+
+# 형식만 고치는 짧은 요청 (판단을 다시 하지 않으므로 프롬프트 / 시세 데이터 없이 응답만 보낸다)
+def repair_messages(raw, error):
+    return [
+        {
+            "role": "system",
+            "content": "다음 텍스트를 주어진 스키마의 JSON 객체 하나로만 바꾸십시오. 내용(판단, 수량, 가격)은 바꾸지 말고, "
+                       "JSON 외의 텍스트는 출력하지 마십시오.\n스키마: " + json.dumps(DECISION_SCHEMA, ensure_ascii=False),
+        },
+        {"role": "user", "content": f"오류: {error}\n\n원문:\n{raw}"},
+    ]
+
+
+# 복구 응답 파싱 (성공 / 실패를 repaired / repair_failed 로 센다)
+def parse_repaired(raw):
+    try:
+        res, _ = parse_response(raw)
+    except DecisionParseError:
+        inc("decision_parse_total", path="repair_failed")
+        raise
+    inc("decision_parse_total", path="repaired")
+    return res
@@ -1,58 +1,97 @@
-import yfinance as yf
+import numpy as np
 import pandas as pd
-import time
 import pytz
 from ai import StockDecisionAI
+from candle_store import get_default_store
+from market_data import get_market_data
+from indicators import IndicatorEngine
+from metrics import span, inc
+from market_calendar import TickScheduler
+from resample import get_resampler
 
 class StockSimulator:
-    def __init__(self, ticker="NVDA", initial_money=1000, model="o4-mini-2025-04-16"):
+    def __init__(self, ticker="NVDA", initial_money=1000, model="o4-mini-2025-04-16", candle_store=None, market_data=None, decision_ai=None, ledger=None, account=None):
         self.ticker = ticker
-        self.stock = yf.Ticker(ticker)
+        self.market_data = market_data or get_market_data()  # 프로세스 전체에서 공유하는 시세 캐시
         self.current_count = 0
+        self.avg_cost = 0.0  # 보유 주식의 평균 매입가
         self.current_money = initial_money
         self.prev_res = None
         self.model = model
-        self.decision_ai = StockDecisionAI()
+        self.decision_ai = decision_ai or StockDecisionAI(model=model)  # 여러 시뮬레이터가 같은 클라이언트를 공유할 수 있다
         self.ma_5m = None
         self.ma_20m = None
         self.ma_5d = None
         self.ma_20d = None
         self.rows = []  # rows 속성 추가
-
-    # 실시간 1분봉 캔들 데이터 가져오기
+        self.candle_store = candle_store or get_default_store()
+        self.intraday = IndicatorEngine()  # 1분봉 지표 (봉 단위로 갱신)
+        self.daily = IndicatorEngine()     # 일봉 지표
+        self.daily_closes = None           # get_ma_1y 가 받아 둔 1년 일봉 종가 (날짜 인덱스)
+
+        # 체결 원장이 있으면 재시작해도 이전 보유 상태에서 이어간다
+        self.ledger = ledger
+        self.account = account or ticker
+        if ledger is not None:
+            position = ledger.open(self.account, ticker, initial_money)
+            self.current_count = position.count
+            self.avg_cost = position.avg_cost
+            self.current_money = ledger.cash(self.account)
+            self.prev_res = position.prev_res
+
+    # 실시간 1분봉 캔들 데이터 가져오기 (이미 받은 봉 이후만 새로 요청)
     def get_live_candles(self, ticker, interval="1m", lookback="1d"):
         try:
-            stock = yf.Ticker(ticker)
-            df = stock.history(period=lookback, interval=interval)
-            
-            # 'Datetime'을 인덱스로 설정
-            df.reset_index(inplace=True)
-            df['Datetime'] = pd.to_datetime(df['Datetime'])
-            
-            # 'Datetime'을 한국 시간(KST)으로 변환
-            df['Datetime'] = df['Datetime'].dt.tz_convert('Asia/Seoul')
-            
-            return df
+            return self.candle_store.get(ticker, interval=interval, lookback=lookback)
         except Exception as e:
             return pd.DataFrame()  # 오류가 나면 빈 데이터프레임 반환
 
 
-    def get_ma_1y(self):
-        price_hist_1y = self.stock.history(period="1y", interval="1d")
-        price_hist_1y["MA_5"] = price_hist_1y["Close"].rolling(window=5).mean()
-        price_hist_1y["MA_20"] = price_hist_1y["Close"].rolling(window=20).mean()
-
-        self.ma_5d = price_hist_1y["MA_5"].iloc[-1] if pd.notna(price_hist_1y["MA_5"].iloc[-1]) else None
-        self.ma_20d = price_hist_1y["MA_20"].iloc[-1] if pd.notna(price_hist_1y["MA_20"].iloc[-1]) else None
+    # 일봉 이동 평균. 1분봉(df)을 주면 오늘 일봉은 분봉에서 직접 만들어 마지막 봉으로 쓴다
+    # (캐시된 일봉이 갱신될 때까지 기다리지 않고 매 틱 최신 종가를 반영)
+    def get_ma_1y(self, df=None):
+        with span("decision_stage_seconds", stage="fetch_daily"):
+            price_hist_1y = self.market_data.history(self.ticker, period="1y", interval="1d")
+        if not price_hist_1y.empty:
+            times = price_hist_1y.index.values
+            closes = price_hist_1y["Close"].to_numpy()
+            today = self.today_bar(df)
+            if today is not None:
+                day = today.name.to_datetime64()
+                keep = times < day
+                times = np.append(times[keep], day)
+                closes = np.append(closes[keep], today["Close"])
+            self.daily.sync(times, closes)
+            self.daily_closes = pd.Series(closes, index=pd.DatetimeIndex(times))  # 프롬프트용 1년 일봉 종가
+            self.ma_5d = self.daily.value("sma_5")
+            self.ma_20d = self.daily.value("sma_20")
 
         return self.ma_5d, self.ma_20d
 
+    # 1분봉에서 만든 오늘(마지막 거래일) 일봉
+    def today_bar(self, df):
+        if df is None or df.empty:
+            return None
+        bars = df.set_index("Datetime") if "Datetime" in df.columns else df
+        return get_resampler().today(self.ticker, bars, base="1m")
+
     def get_ma_recent(self, df):
         if df is not None and not df.empty:
-            self.ma_5m = df["Close"].rolling(window=5).mean().iloc[-1]
-            self.ma_20m = df["Close"].rolling(window=20).mean().iloc[-1]
+            self.intraday.sync(pd.DatetimeIndex(df["Datetime"]).values, df["Close"].to_numpy())
+            self.ma_5m = self.intraday.value("sma_5")
+            self.ma_20m = self.intraday.value("sma_20")
+
+    # 프롬프트에 넘길 기술 지표 (MACD, RSI, 볼린저 밴드 등)
+    def get_indicators(self):
+        return {"1분봉": self.intraday.snapshot(), "일봉": self.daily.snapshot()}
 
     def handle_decision(self, res, current_price):
+        with span("decision_stage_seconds", stage="handle"):
+            result = self._apply_decision(res, current_price)
+        inc("decisions_total", action=result["decision_summary"]["action"] or "none")
+        return result
+
+    def _apply_decision(self, res, current_price):
         action = res.get("action")
         quantity = int(res.get("quantity", 0))  # 기본값으로 0
         price = float(res.get("price", current_price))  # 기본값으로 current_price
@@ -67,7 +106,11 @@ class StockSimulator:
         if action == "buy":
             if price * quantity <= self.current_money:
                 self.current_money -= price * quantity
+                if self.current_count + quantity > 0:
+                    self.avg_cost = (self.avg_cost * self.current_count + price * quantity) / (self.current_count + quantity)
                 self.current_count += quantity
+                if self.ledger is not None:
+                    self.ledger.record(self.account, self.ticker, "buy", quantity, price)
                 action_result = f"🛒 {price:.2f}$에 {quantity}주 매수"
             else:
                 action_result = "❌ 자금 부족으로 매수 실패"
@@ -75,6 +118,10 @@ class StockSimulator:
             if quantity <= self.current_count:
                 self.current_money += price * quantity
                 self.current_count -= quantity
+                if self.current_count == 0:
+                    self.avg_cost = 0.0
+                if self.ledger is not None:
+                    self.ledger.record(self.account, self.ticker, "sell", quantity, price)
                 action_result = f"💰 {price:.2f}$에 {quantity}주 매도"
             else:
                 action_result = "❌ 보유 수량 부족으로 매도 실패"
@@ -84,6 +131,8 @@ class StockSimulator:
             action_result = f"❌ 유효하지 않은 액션: {action}"
 
         self.prev_res = action_result
+        if self.ledger is not None:
+            self.ledger.note(self.account, self.ticker, action_result)
         total_assets = self.current_money + (self.current_count * current_price)
 
         # 반환되는 값에서 각 필드를 확인
@@ -104,39 +153,65 @@ class StockSimulator:
             }
         }
 
-    def run(self):
-        while True:  # 루프 시작
-            # 실시간 데이터 받아오기
+    # 한 틱에 필요한 데이터 수집 (1분봉 + 이동 평균)
+    def collect(self):
+        with span("decision_stage_seconds", stage="fetch"):
             df = self.get_live_candles(ticker=self.ticker, interval="1m", lookback="1d")
-            if df.empty:
-                print("No data available")
-                time.sleep(60)  # 1분 대기 후 다시 시도
-                continue
+        if df.empty:
+            inc("fetch_empty_total")
+            return df
 
-            # 최근 5분, 20분 이동 평균 계산
+        # 최근 5분, 20분 이동 평균 계산
+        with span("decision_stage_seconds", stage="indicators"):
             self.get_ma_recent(df)
 
-            # 1년 이동 평균도 가져오기
-            ma_5d, ma_20d = self.get_ma_1y()
+        # 1년 이동 평균도 가져오기 (일봉 수신은 fetch_daily 로 따로 기록)
+        self.get_ma_1y(df)
+        return df
+
+    # 의사결정 호출 (current_money 를 넘기면 공유 계좌의 현금 기준으로 판단)
+    def decide(self, df, current_money=None):
+        with span("decision_stage_seconds", stage="decide"):
+            return self._decide(df, current_money)
+
+    def _decide(self, df, current_money):
+        return self.decision_ai.get_stock_decision(
+            market="US",
+            company_name=self.ticker,
+            price_hist_1y=self.daily_closes,
+            price_hist_10m=df['Close'][-10:].to_list(),
+            current_price=df['Close'].iloc[-1],
+            current_count=self.current_count,
+            current_money=self.current_money if current_money is None else current_money,
+            ma_5m=self.ma_5m,
+            ma_20m=self.ma_20m,
+            ma_5d=self.ma_5d,
+            ma_20d=self.ma_20d,
+            prev_res=self.prev_res,
+            indicators=self.get_indicators(),
+            avg_cost=self.avg_cost
+        )
+
+    # 한 틱 실행: 수집 → 판단 → 주문 처리
+    def step(self):
+        with span("decision_stage_seconds", stage="tick"):
+            # 실시간 데이터 받아오기
+            df = self.collect()
+            if df.empty:
+                print("No data available")
+                return None
 
             # 의사결정 호출
-            res = self.decision_ai.get_stock_decision(
-                market="US",
-                company_name=self.ticker,
-                price_hist_1y=df['Close'].to_list(),
-                price_hist_10m=df['Close'][-10:].to_list(),
-                current_price=df['Close'].iloc[-1],
-                current_count=self.current_count,
-                current_money=self.current_money,
-                ma_5m=self.ma_5m,
-                ma_20m=self.ma_20m,
-                ma_5d=ma_5d,
-                ma_20d=ma_20d,
-                prev_res=self.prev_res
-            )
+            res = self.decide(df)
 
             # 의사결정에 따른 행동 처리
-            self.handle_decision(res, df['Close'].iloc[-1])
+            return self.handle_decision(res, df['Close'].iloc[-1])
 
-            # 1분마다 반복
-            time.sleep(60)
\ No newline at end of file
+    # 정규장의 1분봉 마감 + offset 초마다 실행 (장이 닫혀 있으면 다음 세션까지 대기)
+    def run(self, scheduler=None, stop=None):
+        scheduler = scheduler or TickScheduler(interval=60)
+        try:
+            scheduler.run(self.step, stop)
+        finally:
+            if self.ledger is not None:
+                self.ledger.flush()  # 모아 둔 체결을 남기고 끝낸다
\ No newline at end of file
@@ -0,0 +1,156 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+
+# get_stock_decision 프롬프트에 적힌 분할 매수/매도 규칙을 그대로 옮긴 기계식 전략
+# - 기준가(적정 주가) 대비 level[k] 이하로 내려가면 예산의 weight[k] 만큼 k차 매수
+# - 평균 매입가 × take_profit 이상이거나 MA × resist_mult 이상이면 전량 매도 (이후 다시 반복)
+# 적정 주가는 LLM 이 계산하던 값이므로 여기서는 fair_window 일 이동 평균으로 대신한다.
+DEFAULT_GRID = {
+    "fair_window": [60, 120, 200],
+    "levels": [(0.9, 0.8, 0.7)],
+    "weights": [(0.2, 0.3, 0.5)],
+    "take_profit": [1.2],
+    "resist_window": [20],
+    "resist_mult": [1.05],
+}
+
+
+def _rolling_mean(values, window):
+    out = np.full(len(values), np.nan)
+    if window <= len(values):
+        csum = np.cumsum(np.r_[0.0, values])
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def expand_grid(grid):
+    grid = dict(DEFAULT_GRID, **grid)
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    return pd.DataFrame(combos)
+
+
+# 파라미터 조합 전체를 한 번에 평가 (시간축은 루프, 조합 축은 벡터 연산)
+def evaluate(close, combos, initial_money=1000.0, fee_rate=0.0, periods_per_year=252):
+    close = np.asarray(close, dtype=float)
+    p_count = len(combos)
+
+    fair_windows = sorted(set(combos["fair_window"]))
+    resist_windows = sorted(set(combos["resist_window"]))
+    fair_table = np.vstack([_rolling_mean(close, w) for w in fair_windows])
+    ma_table = np.vstack([_rolling_mean(close, w) for w in resist_windows])
+    fair_idx = combos["fair_window"].map({w: i for i, w in enumerate(fair_windows)}).to_numpy()
+    ma_idx = combos["resist_window"].map({w: i for i, w in enumerate(resist_windows)}).to_numpy()
+
+    levels = np.array(combos["levels"].tolist(), dtype=float)          # (P, K)
+    budgets = np.array(combos["weights"].tolist(), dtype=float) * initial_money
+    take_profit = combos["take_profit"].to_numpy(dtype=float)
+    resist_mult = combos["resist_mult"].to_numpy(dtype=float)
+    tranches = levels.shape[1]
+
+    cash = np.full(p_count, float(initial_money))
+    shares = np.zeros(p_count)
+    cost = np.zeros(p_count)
+    filled = np.zeros((p_count, tranches), dtype=bool)
+    trades = np.zeros(p_count, dtype=np.int64)
+
+    peak = cash.copy()
+    max_dd = np.zeros(p_count)
+    prev_equity = cash.copy()
+    ret_sum = np.zeros(p_count)
+    ret_sq = np.zeros(p_count)
+
+    for t, price in enumerate(close):
+        fair = fair_table[fair_idx, t]
+        ma = ma_table[ma_idx, t]
+
+        # 매도: 목표 수익률 도달 또는 기술적 저항선 도달
+        holding = shares > 0
+        avg_cost = np.divide(cost, shares, out=np.zeros(p_count), where=holding)
+        sell = holding & ((price >= avg_cost * take_profit) | (price >= ma * resist_mult))
+        if sell.any():
+            cash += np.where(sell, shares * price * (1 - fee_rate), 0.0)
+            shares[sell] = 0
+            cost[sell] = 0
+            filled[sell] = False
+            trades += sell
+
+        # 매수: 기준가 대비 하락 단계별로 한 번씩
+        for k in range(tranches):
+            cond = ~sell & ~filled[:, k] & (price <= fair * levels[:, k])
+            if not cond.any():
+                continue
+            unit = price * (1 + fee_rate)
+            qty = np.floor(np.minimum(budgets[:, k], cash) / unit)
+            buy = cond & (qty > 0)
+            spent = np.where(buy, qty * unit, 0.0)
+            cash -= spent
+            cost += spent
+            shares += np.where(buy, qty, 0.0)
+            filled[:, k] |= buy
+            trades += buy
+
+        equity = cash + shares * price
+        np.maximum(peak, equity, out=peak)
+        np.minimum(max_dd, equity / peak - 1, out=max_dd)
+        if t:
+            r = equity / prev_equity - 1
+            ret_sum += r
+            ret_sq += r * r
+        prev_equity = equity
+
+    steps = max(len(close) - 1, 1)
+    mean = ret_sum / steps
+    std = np.sqrt(np.maximum(ret_sq / steps - mean * mean, 0.0))
+    sharpe = np.divide(mean, std, out=np.full(p_count, np.nan), where=std > 0) * np.sqrt(periods_per_year)
+
+    out = combos.copy()
+    out["final_equity"] = prev_equity
+    out["total_return"] = prev_equity / initial_money - 1
+    out["max_drawdown"] = max_dd
+    out["sharpe"] = sharpe
+    out["trades"] = trades
+    return out
+
+
+def _evaluate_ticker(args):
+    ticker, close, combos, initial_money, fee_rate = args
+    result = evaluate(close, combos, initial_money=initial_money, fee_rate=fee_rate)
+    result.insert(0, "ticker", ticker)
+    return result
+
+
+# 여러 종목 × 여러 파라미터 조합을 프로세스 풀로 나눠 평가하고 순위를 매긴다
+# prices: {ticker: 일별 종가 배열 또는 Series}
+def run_sweep(prices, grid=None, initial_money=1000.0, fee_rate=0.0, rank_by="sharpe", max_workers=None):
+    combos = expand_grid(grid or {})
+    jobs = [
+        (ticker, np.asarray(close, dtype=float), combos, initial_money, fee_rate)
+        for ticker, close in prices.items()
+    ]
+    if max_workers == 1 or len(jobs) <= 1:
+        per_ticker = [_evaluate_ticker(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            per_ticker = list(pool.map(_evaluate_ticker, jobs))
+
+    results = pd.concat(per_ticker, ignore_index=True)
+    return rank(results, combos.columns.tolist(), rank_by), results
+
+
+# 조합별로 종목 평균 성과를 내서 정렬
+def rank(results, param_columns, by="sharpe"):
+    keyed = results.assign(_key=results[param_columns].astype(str).agg("|".join, axis=1))
+    summary = keyed.groupby("_key", sort=False).agg(
+        **{c: (c, "first") for c in param_columns},
+        mean_return=("total_return", "mean"),
+        mean_sharpe=("sharpe", "mean"),
+        worst_drawdown=("max_drawdown", "min"),
+        trades=("trades", "sum"),
+        tickers=("ticker", "nunique"),
+    )
+    column = {"sharpe": "mean_sharpe", "total_return": "mean_return", "max_drawdown": "worst_drawdown"}.get(by, by)
+    return summary.sort_values(column, ascending=False, na_position="last").reset_index(drop=True)